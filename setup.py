@@ -36,7 +36,7 @@ setup(
     packages=find_packages(where='src', exclude=['tests*', '*.tests', '*.tests.*']),
     include_package_data=True,  # Important to include files specified in MANIFEST.in
     install_requires=parse_requirements(),
-    python_requires='>=3.8', # Specify your minimum Python version
+    python_requires='>=3.9', # Specify your minimum Python version
     entry_points={
         'console_scripts': [
             'drone-ai-pr-reviewer = drone_ai_pr_reviewer.main:main_cli',
@@ -49,7 +49,6 @@ setup(
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.8',
         'Programming Language :: Python :: 3.9',
         'Programming Language :: Python :: 3.10',
         'Programming Language :: Python :: 3.11',
@@ -1,254 +1,257 @@
 # src/drone_ai_pr_reviewer/diff_parser.py
+import copy
+import functools
+import itertools
 import logging
 import subprocess
 import re
-from typing import List, Optional, Dict, Tuple
-from .utils.file_filter import filter_files_by_patterns
+from typing import BinaryIO, Callable, List, Optional, Iterable, Iterator, Tuple, Union
+from .utils.file_filter import compile_path_filter
 from .models import DiffFile, DiffChunk
 
 logger = logging.getLogger(__name__)
 
-def get_git_diff(base_sha: str, head_sha: str, cwd: Optional[str] = None) -> str:
-    """Get diff between two git commits.
+_DIFF_GIT_PREFIX = "diff --git "
+_DIFF_GIT_PREFIX_BYTES = b"diff --git "
+# Hunk header: "@@ -<source_start>[,<count>] +<target_start>[,<count>] @@ [section]"
+_HUNK_RE = re.compile(r"^@@ -(\d+)(?:,\d+)? \+(\d+)(?:,\d+)? @@")
+# Leading "a/" or "b/" prefix git puts on the paths of a file header
+_AB_STRIP = re.compile(r"^[ab]/")
+# Size of the reads from git's stdout when streaming a diff
+_READ_CHUNK_SIZE = 1 << 16
+# First characters of hunk body lines (added, removed, context)
+_HUNK_BODY_CHARS = frozenset("+- ")
+
+def iter_lines_chunked(fp: BinaryIO, chunk_size: int = _READ_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Yields the lines of a binary stream, without their "\\n", reading it in fixed-size chunks.
+
+    Each read is split into many lines at once, which is cheaper than a readline per line.
+    """
+    tail = b""
+    while True:
+        data = fp.read(chunk_size)
+        if not data:
+            break
+        lines = (tail + data).split(b"\n")
+        tail = lines.pop()  # Incomplete last line, completed by the next read
+        yield from lines
+    if tail:
+        yield tail
+
+def get_git_diff(base_sha: str, head_sha: str, cwd: Optional[str] = None) -> Iterator[bytes]:
+    """Stream the diff between two git commits line by line.
+
+    The output is never held in memory as a whole: lines are yielded as git
+    produces them, so parse_diff_text can consume them while git is still
+    writing. Lines are left undecoded; parse_diff_text only decodes the ones
+    it keeps. git is started on the first iteration.
 
     Args:
         base_sha: Base commit SHA
         head_sha: Head commit SHA
         cwd: Working directory for git command
 
-    Returns:
-        str: Git diff output
+    Yields:
+        bytes: Raw git diff output lines, without their line terminator
 
     Raises:
-        subprocess.CalledProcessError: If git command fails
+        subprocess.CalledProcessError: If git command fails, once its output is consumed
     """
     cmd = ["git", "diff", "-U0", base_sha, head_sha]
-    result = subprocess.run(cmd, capture_output=True, text=True, check=True, cwd=cwd)
-    return result.stdout
+    # Unbuffered pipes: iter_lines_chunked does its own buffering with large reads
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0, cwd=cwd)
+    completed = False
+    try:
+        yield from iter_lines_chunked(proc.stdout)
+        completed = True
+    finally:
+        if not completed and proc.poll() is None:
+            # The consumer stopped early; don't leave git blocked on a full pipe
+            proc.kill()
+        stderr = proc.stderr.read()
+        proc.stdout.close()
+        proc.stderr.close()
+        returncode = proc.wait()
+
+    subprocess.CompletedProcess(cmd, returncode, stderr=stderr).check_returncode()
+
+def _split_header_paths(line: str) -> Tuple[Optional[str], Optional[str]]:
+    """Returns the (old, new) paths of a "diff --git a/path b/path" line, without their a/ b/ prefixes."""
+    paths = line.split()[2:4]
+    old_path = _AB_STRIP.sub("", paths[0], count=1) if len(paths) > 0 else None
+    new_path = _AB_STRIP.sub("", paths[1], count=1) if len(paths) > 1 else None
+    return old_path, new_path
+
+def _decode_diff_lines(raw_lines: Iterable[bytes], keep_path: Callable[[str], bool]) -> Iterator[str]:
+    """
+    Decodes raw diff lines, passing over the lines of filtered-out files undecoded.
+
+    All structural tokens of a diff are ASCII, so file headers can be recognised
+    on the raw bytes; everything else is only decoded if its file is kept. This is
+    where keep_path is applied; the parser does not check the kept headers again.
+    """
+    skipping = False
+    for raw in raw_lines:
+        if raw.startswith(_DIFF_GIT_PREFIX_BYTES):
+            line = raw.rstrip(b"\r\n").decode("utf-8", "replace")
+            new_path = _split_header_paths(line)[1]
+            skipping = not new_path or not keep_path(new_path)
+            # Always forwarded so the parser closes the previous file; a rejected file's header
+            # loses its paths, so the parser opens no file for it
+            yield _DIFF_GIT_PREFIX if skipping else line
+        elif not skipping:
+            yield raw.rstrip(b"\r\n").decode("utf-8", "replace")
 
 def parse_diff_text(
-    diff_text: str,
+    diff_text: Union[str, bytes, Iterable[str], Iterable[bytes]],
     exclude_patterns: Optional[List[str]] = None,
-    include_patterns: Optional[List[str]] = None
+    include_patterns: Optional[List[str]] = None,
+    path_filter: Optional[Callable[[str], bool]] = None
 ) -> List[DiffFile]:
     """
     Parses raw diff text (e.g., from git diff or SCM API) into a list of DiffFile objects.
 
+    The diff is lexed in a single pass with a small state machine dispatched on the
+    first character of each line: inside a hunk body lines are collected raw,
+    otherwise only file headers and hunk headers are recognised. Per-line changes are only
+    built when a DiffChunk is actually read.
+
     Args:
-        diff_text: The raw diff output as a string.
+        diff_text: The raw diff output, either whole (str or bytes) or as an iterable
+            of lines (e.g. from get_git_diff) so large diffs can be parsed while
+            streaming. Bytes are decoded as UTF-8, only for the files that are kept.
+        exclude_patterns: Optional list of git-style patterns of files to drop.
+        include_patterns: Optional list of git-style patterns of files to keep.
+        path_filter: A predicate from compile_path_filter to use instead of
+            compiling the patterns again; the patterns are ignored when given.
 
     Returns:
         A list of DiffFile objects representing the parsed diff.
     """
-    if not diff_text:
-        return []
+    if isinstance(diff_text, (str, bytes)):
+        # Only scan the whole text when it starts with whitespace; real diffs start with "diff --git"
+        if not diff_text or (diff_text[:1].isspace() and diff_text.isspace()):
+            logger.debug("Received empty diff text, returning no parsed files.")
+            return []
+        raw_lines: Iterator = iter(diff_text.splitlines())
+    else:
+        raw_lines = iter(diff_text or ())
+
+    # Compiled once; rejected files are dropped at their header so none of their hunks are parsed
+    keep_path = path_filter or compile_path_filter(include_patterns, exclude_patterns)
 
-    if not diff_text or diff_text.isspace():
-        logger.debug("Received empty diff text, returning no parsed files.")
+    first = next(raw_lines, None)
+    if first is None:
         return []
+    raw_lines = itertools.chain((first,), raw_lines)
+    # Path check of the parser, for lines that were not already filtered while being decoded
+    check_path: Optional[Callable[[str], bool]] = keep_path
+    if isinstance(first, bytes):
+        lines: Iterable[str] = _decode_diff_lines(raw_lines, keep_path)
+        check_path = None
+    elif isinstance(diff_text, str):
+        lines = raw_lines
+    else:
+        lines = (line.rstrip("\r\n") for line in raw_lines)
+
+    result: List[DiffFile] = []
+    current_file: Optional[DiffFile] = None
+    current_chunk: Optional[DiffChunk] = None
 
-    # Process the diff text
-    result = []
-    current_file = None
-    current_chunk = None
-    current_hunk_line = 0
-    current_diff_line = 0
-    
-    for line in diff_text.splitlines():
-        if line.startswith("diff --git"):
-            # Add the last file if it exists
-            if current_file and current_chunk:
-                current_file.chunks.append(current_chunk)
-                current_file.hunk_line_mappings.append(current_chunk.hunk_line_mapping)
+    for line in lines:
+        c0 = line[:1]
+
+        # Hunk bodies make up nearly all lines, so they are recognised first with a
+        # single set lookup on the first character. File header lines ("index", "---",
+        # "+++", ...) arrive while no hunk is open and are skipped.
+        if c0 in _HUNK_BODY_CHARS and current_chunk is not None:
+            # Changes and line mappings are derived lazily by DiffChunk
+            current_chunk.lines.append(line)
+
+        elif c0 == "d" and line.startswith(_DIFF_GIT_PREFIX):
+            if current_file and current_file.chunks:
                 result.append(current_file)
-            
-            paths = line.split()[2:4]  # Get the paths from "diff --git a/path b/path"
-            display_path = paths[1].split("b/")[1] if len(paths) > 1 else None
-            
+            current_chunk = None
+
+            old_path, display_path = _split_header_paths(line)
+
             # Skip if file doesn't match patterns
-            if not display_path or not filter_files_by_patterns([display_path], include_patterns, exclude_patterns):
+            if not display_path or (check_path and not check_path(display_path)):
                 current_file = None
-                current_chunk = None
                 continue
-                
+
             current_file = DiffFile(
-                old_path=paths[0].split('a/')[1] if len(paths) > 0 else None,
-                new_path=paths[1].split('b/')[1] if len(paths) > 1 else None,
-                chunks=[],
-                hunk_line_mappings=[]
+                old_path=old_path,
+                new_path=display_path,
+                chunks=[]
             )
-            current_chunk = None
-            current_hunk_line = 0
-            current_diff_line = 0
-            
-        elif line.startswith("@@") and current_file:
-            # New hunk section
-            if current_chunk:
-                current_file.chunks.append(current_chunk)
-                current_file.hunk_line_mappings.append(current_chunk.hunk_line_mapping)
-            
-            # Extract header from the hunk line
-            header = line if line.startswith("@@") else ""
+
+        elif c0 == "@" and current_file:
+            match = _HUNK_RE.match(line)
+            if not match:
+                # Close the previous hunk, so the lines of the unreadable one are dropped with it
+                current_chunk = None
+                continue
             current_chunk = DiffChunk(
-                content=header + "\n",  # Start with header
-                changes=[],
-                header=header,
-                hunk_line_mapping={}
+                header=line,
+                source_start=int(match.group(1)),
+                target_start=int(match.group(2))
             )
-            current_hunk_line = 1
-            current_diff_line = 1
-            
-        elif line.startswith("+") and current_chunk:
-            # Added line
-            current_chunk.content += line + "\n"
-            current_chunk.changes.append({
-                "type": "add",
-                "content": line[1:],
-                "ln": current_hunk_line,
-                "ln2": None
-            })
-            current_chunk.hunk_line_mapping[current_hunk_line] = (current_hunk_line, current_diff_line)
-            current_hunk_line += 1
-            current_diff_line += 1
-            
-        elif line.startswith("-") and current_chunk:
-            # Removed line
-            current_chunk.content += line + "\n"
-            current_chunk.changes.append({
-                "type": "remove",
-                "content": line[1:],
-                "ln": None,
-                "ln2": current_hunk_line
-            })
-            current_diff_line += 1
-            
-        elif line.startswith(" ") and current_chunk:
-            # Context line
-            current_chunk.content += line + "\n"
-            current_chunk.changes.append({
-                "type": "context",
-                "content": line[1:],
-                "ln": current_hunk_line,
-                "ln2": current_hunk_line
-            })
-            current_chunk.hunk_line_mapping[current_hunk_line] = (current_hunk_line, current_diff_line)
-            current_hunk_line += 1
-            current_diff_line += 1
-            
+            current_file.chunks.append(current_chunk)
+
     # Add the last file if it exists
-    if current_file and current_chunk:
-        current_file.chunks.append(current_chunk)
+    if current_file and current_file.chunks:
         result.append(current_file)
-    
+
     return result
-    
-    # Only process files that match the patterns
-    filtered_files = [file for file in patch_set if file.path in filtered_paths]
-    
-    # Process each file
-    result = []
-    for patched_file in filtered_files:
-        # Skip files that are only in the diff due to mode changes but no content change
-        if not patched_file.is_removed_file and \
-           not patched_file.is_added_file and \
-           not patched_file.is_modified_file and \
-           not patched_file.is_renamed_file: 
-            logger.debug(f"Skipping file with no content changes (e.g. mode only): {patched_file.source_file} -> {patched_file.target_file}")
-            continue
-        
-        # Skip deleted files as per common requirement (LLM can't comment on non-existent new lines)
-        if patched_file.is_removed_file:
-            logger.info(f"Skipping deleted file: {patched_file.source_file}")
-            continue
-        
-        # For new files, source_file is often '/dev/null' or similar
-        # For deleted files, target_file is often '/dev/null'
-        new_path = patched_file.target_file
-        if new_path.startswith("b/"): # unidiff often prefixes target files with 'b/'
-            new_path = new_path[2:]
-        
-        old_path = patched_file.source_file
-        if old_path.startswith("a/"): # unidiff often prefixes source files with 'a/'
-            old_path = old_path[2:]
-        
-        # Check for /dev/null to correctly set paths for new/deleted (though we skip deleted)
-        if new_path == "/dev/null": # Should have been caught by is_removed_file
-             logger.warning(f"File considered not deleted but target is /dev/null: {old_path}")
-             continue 
-        if old_path == "/dev/null": # This indicates a new file
-            is_new = True
-            old_p = None
-        else:
-            is_new = patched_file.is_added_file # More direct check
-            old_p = old_path
-
-        diff_file_model = DiffFile(
-            old_path=old_p,
-            new_path=new_path,
-            is_new_file=is_new,
-            is_deleted_file=patched_file.is_removed_file,
-            is_renamed_file= (old_p is not None and new_path is not None and old_p != new_path and not is_new and not patched_file.is_removed_file), # Heuristic for rename
-            diff_file_native_obj=patched_file # Store the original unidiff object
-        )
-
-        for hunk in patched_file:
-            # Construct the diff content for the LLM for this hunk
-            # This should include context lines, added lines, removed lines,
-            # and potentially line numbers from the diff hunk itself.
-            # The prompt example used:
-            # ```diff
-            # ${chunk.content}  <-- This is usually the hunk header line like @@ -1,5 +1,7 @@
-            # ${chunk.changes.map((c) => `${c.ln ? c.ln : c.ln2} ${c.content}`).join("\n")} <-- Lines with their diff line numbers
-            # ```
-            # We need to replicate this formatting.
-            
-            # Track line numbers for mapping
-            current_chunk.hunk_line_mapping = {}
-            target_line = 1  # Line number in the target file
-            source_line = 1  # Line number in the source file
-            diff_line = 1  # Line number in the diff
-
-            # Add line numbers for each line in the chunk
-            for change in current_chunk.changes:
-                if change["type"] in ["add", "context"]:
-                    current_chunk.hunk_line_mapping[target_line] = (target_line, diff_line)
-                    target_line += 1
-                elif change["type"] == "remove":
-                    source_line += 1
-                diff_line += 1
-
-            # Store the line mapping for this hunk
-            diff_file_model.hunk_line_mappings.append(current_chunk.hunk_line_mapping)
-
-            chunk_content = str(hunk)
-            chunk_changes = [
-                {
-                    "ln": line.target_line_no if line.target_line_no else None,
-                    "ln2": line.source_line_no if line.source_line_no else None,
-                    "content": line.value
-                }
-                for line in hunk
-            ]
-
-            header = "" # Default empty header
-            header_match = re.search(r'@@ .+ @@', chunk_content)
-            if header_match:
-                header = header_match.group(0)
-
-            diff_file_model.chunks.append(DiffChunk(
-                content=chunk_content,
-                changes=chunk_changes,
-                header=header,
-                hunk_line_mapping=current_chunk.hunk_line_mapping
-            ))
-
-        if diff_file_model.chunks: # Only add file if it has reviewable chunks
-            parsed_files.append(diff_file_model)
-        else:
-            logger.info(f"Skipping file {new_path} as it has no reviewable chunks after parsing.")
-
-    logger.info(f"Parsed {len(parsed_files)} files from diff text.")
-    return parsed_files
+
+@functools.lru_cache(maxsize=32)
+def _parse_git_diff_cached(
+    base_sha: str,
+    head_sha: str,
+    cwd: Optional[str],
+    exclude_patterns: Tuple[str, ...],
+    include_patterns: Tuple[str, ...]
+) -> Tuple[DiffFile, ...]:
+    return tuple(parse_diff_text(
+        get_git_diff(base_sha, head_sha, cwd=cwd),
+        exclude_patterns=list(exclude_patterns) or None,
+        include_patterns=list(include_patterns) or None
+    ))
+
+def get_parsed_diff(
+    base_sha: str,
+    head_sha: str,
+    cwd: Optional[str] = None,
+    exclude_patterns: Optional[List[str]] = None,
+    include_patterns: Optional[List[str]] = None
+) -> List[DiffFile]:
+    """Get the parsed diff between two git commits, memoized per commit pair.
+
+    Repeated requests for the same (base_sha, head_sha, cwd, patterns) — retries,
+    multiple review passes — reuse the first parse instead of re-running git.
+    Only pass immutable commit SHAs; symbolic refs such as HEAD would be cached too.
+
+    Args:
+        base_sha: Base commit SHA
+        head_sha: Head commit SHA
+        cwd: Working directory for git command
+        exclude_patterns: Optional git-style patterns of files to skip
+        include_patterns: Optional git-style patterns of files to keep
+
+    Returns:
+        A fresh list of DiffFile objects; callers may mutate it without affecting the cache.
+
+    Raises:
+        subprocess.CalledProcessError: If git command fails
+    """
+    cached = _parse_git_diff_cached(
+        base_sha, head_sha, cwd,
+        tuple(exclude_patterns or ()),
+        tuple(include_patterns or ())
+    )
+    return copy.deepcopy(list(cached))
 
 # Example usage (for testing this module standalone):
 # if __name__ == '__main__':
@@ -1,39 +1,51 @@
 import os
 import logging
-from typing import Optional
+from typing import Dict, Optional
 
 logger = logging.getLogger(__name__)
 
+def _provider_env(provider: str, api_key: Optional[str], api_base: Optional[str], azure_api_version: Optional[str]) -> Dict[str, Optional[str]]:
+    """Returns the environment variables LiteLLM reads for a provider."""
+    if provider == "azure":
+        env = {"AZURE_API_KEY": api_key, "AZURE_API_VERSION": azure_api_version}
+        if api_base:
+            env["AZURE_API_BASE"] = api_base
+    elif provider == "ollama":
+        # Ollama uses a local API endpoint
+        env = {"OLLAMA_API_BASE": api_base or "http://localhost:11434"}
+    else:
+        # Default to OpenAI/OpenRouter/Novita
+        env = {"OPENAI_API_KEY": api_key}
+        if api_base:
+            env["OPENAI_API_BASE"] = api_base
+    return env
+
+def _export_provider_env(provider: str, api_key: Optional[str], api_base: Optional[str], azure_api_version: Optional[str]) -> None:
+    """
+    Writes the environment variables LiteLLM reads for a provider.
+
+    Compared against the current os.environ rather than memoized, so a variable changed
+    or removed since the last setup is written again, and only values that differ are set.
+    Settings that are not configured are skipped, leaving any value already in the environment.
+    """
+    for name, value in _provider_env(provider, api_key, api_base, azure_api_version).items():
+        if value is not None and os.environ.get(name) != value:
+            os.environ[name] = value
+
 def setup_liteLLM_provider_specific_env(config: 'PluginConfig') -> bool:
     """
     Sets up environment variables specific to the chosen LLM provider.
     Returns True if setup was successful, False otherwise.
     """
     try:
-        # Infer provider from model name
-        model_name = config.llm_model.lower() if config.llm_model else ""
-        
-        if "azure" in model_name:
-            os.environ["AZURE_API_KEY"] = config.llm_api_key
-            os.environ["AZURE_API_BASE"] = config.azure_api_version
-            os.environ["AZURE_API_VERSION"] = config.azure_api_version
-        elif "ollama" in model_name:
-            # Ollama uses a local API endpoint
-            os.environ["OLLAMA_API_BASE"] = config.llm_api_base or "http://localhost:11434"
-        else:
-            # Default to OpenAI/OpenRouter/Novita
-            os.environ["OPENAI_API_KEY"] = config.llm_api_key
-            if config.llm_api_base:
-                os.environ["OPENAI_API_BASE"] = config.llm_api_base
-                
-        logger.info(f"Successfully configured LiteLLM for model: {config.llm_model}")
-        return True
-            
-        logger.info(f"Successfully configured LiteLLM for provider: {provider}")
+        provider = config.llm_provider
+        _export_provider_env(provider, config.llm_api_key, config.llm_api_base, config.azure_api_version)
+
+        logger.info("Successfully configured LiteLLM for model: %s (provider: %s)", config.llm_model, provider)
         return True
-        
+
     except Exception as e:
-        logger.error(f"Error setting up LiteLLM provider: {e}", exc_info=True)
+        logger.error("Error setting up LiteLLM provider: %s", e, exc_info=True)
         return False
 
 
@@ -43,7 +55,7 @@ def validate_llm_config(config: 'PluginConfig') -> bool:
     Returns True if configuration is valid, False otherwise.
     """
     try:
-        provider = config.llm_provider.lower()
+        provider = config.llm_provider
         
         if not config.llm_api_key:
             logger.error("LLM API key is required")
@@ -65,5 +77,5 @@ def validate_llm_config(config: 'PluginConfig') -> bool:
         return True
         
     except Exception as e:
-        logger.error(f"Error validating LLM configuration: {e}", exc_info=True)
+        logger.error("Error validating LLM configuration: %s", e, exc_info=True)
         return False
\ No newline at end of file
@@ -1,10 +1,23 @@
 # src/drone_ai_pr_reviewer/llm_reviewer.py
+import asyncio
+import functools
+import hashlib
 import json
 import logging
+import os
+import re
+import httpx
 import litellm  # type: ignore
-from string import Template
 import importlib.resources # For loading prompt from package data
-from typing import List, Dict, Any, Optional, TYPE_CHECKING
+import importlib.util
+import random
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple, Union, TYPE_CHECKING
+
+from .utils.constants import REVIEW_CACHE_TTL_SECONDS
+from .utils.review_cache import ReviewCheckpoint, ReviewDiskCache
 
 if TYPE_CHECKING:
     from .plugin_config import PluginConfig
@@ -12,6 +25,224 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+# HTTP/2 lets concurrent chunk reviews share one TLS connection; it needs the optional 'h2' package (httpx[http2])
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Transient LLM failures worth retrying; bad responses (APIError, invalid JSON) are not retried
+_RETRYABLE_LLM_ERRORS = (
+    litellm.exceptions.RateLimitError,
+    litellm.exceptions.APIConnectionError,
+    litellm.exceptions.Timeout,
+)
+_LLM_MAX_ATTEMPTS = 5
+_LLM_BACKOFF_INITIAL = 1.0 # Seconds before the first retry, doubled on each attempt
+_LLM_BACKOFF_MAX = 30.0
+_LLM_RETRY_AFTER_MAX = 60.0 # Cap on a server-provided Retry-After, so a CI step never stalls for long
+# Known JSON-mode model families, for models missing from LiteLLM's capability map (e.g. offline or custom names)
+_JSON_MODE_MODEL_RE = re.compile(r"gpt-4|gpt-3\.5-turbo-1106|claude-3|gemini-1\.5", re.IGNORECASE)
+# Shape of the review response, enforced server-side by models with structured output support
+_REVIEW_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "reviews": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "lineNumber": {"type": "integer"},
+                    "reviewComment": {"type": "string"},
+                },
+                "required": ["lineNumber", "reviewComment"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["reviews"],
+    "additionalProperties": False,
+}
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """Returns the delay requested by a Retry-After header on the error's response, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    value = headers.get("Retry-After") if headers else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try: # HTTP-date form
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+# Placeholders filled in for every chunk, with the label used if a template lacks one
+_PROMPT_PLACEHOLDERS = {
+    "file_to": "File Path",
+    "pr_title": "Pull Request Title",
+    "pr_description": "Pull Request Description",
+    "diff_chunk_content": "Git diff chunk to review",
+}
+# A ${name} placeholder of the prompt file
+_TEMPLATE_PLACEHOLDER_RE = re.compile(r"\$\{(\w+)\}")
+# The same placeholder once literal braces have been doubled
+_PLACEHOLDER_RE = re.compile(r"\$\{\{(\w+)\}\}")
+
+def _to_format_string(template_str: str) -> str:
+    """
+    Converts a ${name}-style prompt into a str.format_map string, escaping its literal braces (e.g. JSON examples).
+
+    Validation happens here, once: required placeholders missing from the template are
+    appended, and unknown ones are kept as literal text, so rendering can never fail.
+    """
+    found = set(_TEMPLATE_PLACEHOLDER_RE.findall(template_str))
+    missing = [name for name in _PROMPT_PLACEHOLDERS if name not in found]
+    if missing:
+        logger.warning(f"Prompt template is missing placeholders {missing}; appending them.")
+        template_str += "".join(f"\n{_PROMPT_PLACEHOLDERS[name]}:\n${{{name}}}" for name in missing)
+
+    escaped = template_str.replace("{", "{{").replace("}", "}}")
+    return _PLACEHOLDER_RE.sub(
+        lambda m: f"{{{m.group(1)}}}" if m.group(1) in _PROMPT_PLACEHOLDERS else m.group(0),
+        escaped
+    )
+
+def _read_prompt_file(file_name: str, fallback: str) -> str:
+    """Reads a packaged prompt file, returning `fallback` if it is missing."""
+    try:
+        return importlib.resources.files('drone_ai_pr_reviewer.prompts').joinpath(file_name).read_text(encoding='utf-8')
+    except (FileNotFoundError, ModuleNotFoundError):
+        logger.error(f"Prompt template file '{file_name}' not found in package.")
+        return fallback
+
+@functools.lru_cache(maxsize=1)
+def _load_prompt_template() -> Tuple[str, str]:
+    """
+    Loads the review prompts from the packaged files, once per process.
+
+    The system prompt holds only the fixed reviewer instructions, so it is the same
+    for every chunk and providers can cache it as a shared prefix; everything that
+    varies per chunk goes in the user prompt.
+
+    Returns:
+        (system_prompt, user_prompt_format), the latter a format string for str.format_map.
+    """
+    system_prompt = _read_prompt_file(
+        'default_review_prompt.txt',
+        'You are an expert code reviewer. Respond in JSON: {"reviews": [{"lineNumber": <int>, "reviewComment": "<markdown>"}]}' # Basic fallback
+    )
+    user_prompt = _read_prompt_file(
+        'review_chunk_prompt.txt',
+        "Review this diff for file ${file_to} (PR: ${pr_title}):\n${pr_description}\n\n${diff_chunk_content}" # Basic fallback
+    )
+    logger.info("Prompt template loaded.")
+    return system_prompt, _to_format_string(user_prompt)
+
+def _supports_response_schema(model: Optional[str]) -> bool:
+    """Whether the model can be held to a JSON schema (structured outputs), per LiteLLM's capability map."""
+    if not model:
+        return False
+    try:
+        return bool(litellm.supports_response_schema(model=model))
+    except Exception as e: # Unknown provider or model
+        logger.debug("LiteLLM could not report response format support for %s: %s", model, e)
+        return False
+
+def _supports_json_mode(model: Optional[str], supports_response_schema: bool) -> bool:
+    """
+    Whether the model can be asked for a JSON object response: it supports structured outputs
+    (supports_response_schema, from _supports_response_schema) or belongs to a known family.
+    """
+    if not model:
+        return False
+    return supports_response_schema or bool(_JSON_MODE_MODEL_RE.search(model))
+
+def _parse_reviews(llm_response_content: str, schema_enforced: bool = False) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Parses and validates the review items of an LLM JSON response in a single pass.
+
+    Responses whose top level is not the expected object are rejected before any item is looked at.
+    Every returned item has an int "lineNumber" and a str "reviewComment", so callers need no
+    further checks.
+
+    Args:
+        llm_response_content: The JSON text returned by the LLM.
+        schema_enforced: The response was requested with _REVIEW_SCHEMA as a structured output,
+            so it is taken as is; item-by-item validation only runs if it does not match after all
+            (e.g. a router fallback to a model without structured outputs).
+
+    Returns:
+        (valid_reviews, well_formed): well_formed is False if anything in the response had to be
+        dropped (wrong shape, missing "reviews", malformed items), so it should not be cached.
+
+    Raises:
+        json.JSONDecodeError: If the content is not valid JSON.
+    """
+    parsed_response = json.loads(llm_response_content)
+    if schema_enforced:
+        try:
+            return [{"lineNumber": int(item["lineNumber"]), "reviewComment": str(item["reviewComment"])}
+                    for item in parsed_response["reviews"]], True
+        except (KeyError, TypeError, ValueError):
+            logger.debug("LLM response does not match the review schema; validating it item by item.")
+
+    if not isinstance(parsed_response, dict):
+        logger.warning(f"LLM response is not a JSON object (got {type(parsed_response).__name__}); ignoring it.")
+        return [], False
+
+    # Handle both direct reviews and wrapped in additionalProperties
+    reviews = parsed_response.get("reviews")
+    if not reviews and isinstance(parsed_response.get("additionalProperties"), dict):
+        reviews = parsed_response["additionalProperties"].get("reviews", reviews)
+    if reviews is None:
+        logger.warning("LLM response has no 'reviews'; ignoring it.")
+        return [], False
+    if not isinstance(reviews, list):
+        logger.warning(f"LLM response 'reviews' is not a list (got {type(reviews).__name__}); ignoring it.")
+        return [], False
+
+    valid_reviews = []
+    well_formed = True
+    for item in reviews:
+        if isinstance(item, dict) and "lineNumber" in item and "reviewComment" in item:
+            try:
+                item["lineNumber"] = int(str(item["lineNumber"])) # Ensure it's int
+                item["reviewComment"] = str(item["reviewComment"])
+                valid_reviews.append(item)
+                continue
+            except (ValueError, TypeError) as e:
+                logger.warning(f"Invalid lineNumber or reviewComment type in review item: {item}. Error: {e}")
+        else:
+            logger.warning(f"Malformed review item from LLM (expected dict with keys): {item}")
+        well_formed = False
+    return valid_reviews, well_formed
+
+class _TokenBucket:
+    """
+    Token bucket limiting how many requests are started per second.
+
+    Holds up to `rate` tokens (one second of burst) and refills continuously.
+    """
+    def __init__(self, rate: float):
+        self._rate = rate
+        self._capacity = max(rate, 1.0)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Waits until a token is available and takes it."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
 class LLMReviewer:
     def __init__(self, config: 'PluginConfig'):
         """
@@ -21,62 +252,258 @@ class LLMReviewer:
             config: The plugin configuration object.
         """
         self.config = config
-        self.prompt_template: Optional[Template] = None
-        self._load_prompt_template()
-
-    def _load_prompt_template(self):
-        """Loads the review prompt template from the packaged file."""
-        try:
-            # For Python 3.9+
-            prompt_file_ref = importlib.resources.files('drone_ai_pr_reviewer.prompts').joinpath('default_review_prompt.txt')
-            prompt_template_str = prompt_file_ref.read_text(encoding='utf-8')
-        except AttributeError: # Fallback for Python < 3.9
+        # Shared by all reviewers: static system prompt and per-chunk user prompt format
+        self.system_prompt, self.prompt_template = _load_prompt_template()
+        # Successful reviews keyed by a digest of (model, system prompt, user prompt); identical
+        # requests (e.g. the same hunk re-requested) are only sent to the LLM once.
+        self._review_cache: Dict[str, List[Dict[str, Any]]] = {}
+        # Optional persistent tier of the same cache, so re-run CI builds skip the LLM entirely
+        self._disk_cache: Optional[ReviewDiskCache] = None
+        if config.cache_dir:
+            try:
+                self._disk_cache = ReviewDiskCache(os.path.join(config.cache_dir, "reviews"), REVIEW_CACHE_TTL_SECONDS)
+            except OSError as e:
+                logger.warning(f"Review cache directory {config.cache_dir} is not usable, caching in memory only: {e}")
+        # Optional log of completed reviews; reviews from an earlier, interrupted run are reused
+        self._checkpoint: Optional[ReviewCheckpoint] = None
+        if config.checkpoint_path:
             try:
-                with importlib.resources.path('drone_ai_pr_reviewer.prompts', 'default_review_prompt.txt') as p_path:
-                    with open(p_path, 'r', encoding='utf-8') as f:
-                        prompt_template_str = f.read()
-            except FileNotFoundError:
-                logger.error("Prompt template file 'default_review_prompt.txt' not found in package.")
-                prompt_template_str = "Review this diff for file ${file_to}:\n${diff_chunk_content}" # Basic fallback
-        except FileNotFoundError: # Catch if .files() itself fails to find the package path
-            logger.error("Prompt template file 'default_review_prompt.txt' not found (package path issue).")
-            prompt_template_str = "Review this diff for file ${file_to}:\n${diff_chunk_content}" # Basic fallback
-        
-        self.prompt_template = Template(prompt_template_str)
-        logger.info("Prompt template loaded.")
-
-
-    def _create_prompt_messages(self, file_path: str, diff_chunk_content: str) -> List[Dict[str, str]]:
+                self._checkpoint = ReviewCheckpoint(config.checkpoint_path)
+                resumed = self._checkpoint.load()
+                if resumed:
+                    logger.info(f"Resuming from checkpoint {config.checkpoint_path}: {len(resumed)} chunk review(s) already done.")
+                    self._review_cache.update(resumed)
+            except OSError as e:
+                logger.warning(f"Review checkpoint {config.checkpoint_path} is not usable, continuing without it: {e}")
+        # One pooled client for all LLM calls, so chunk reviews reuse connections instead of
+        # paying a TCP+TLS handshake each. LiteLLM picks it up through aclient_session.
+        self._http_client = httpx.AsyncClient(
+            http2=_HTTP2_AVAILABLE,
+            # Sized to the review concurrency, so every in-flight request keeps its connection alive
+            limits=httpx.Limits(
+                max_connections=max(1, config.llm_concurrency),
+                max_keepalive_connections=max(1, config.llm_concurrency),
+            ),
+            timeout=60,
+        )
+        litellm.aclient_session = self._http_client
+        self._router: Optional[litellm.Router] = self._build_router()
+        # With a router, llm_model names a deployment group; capabilities come from its first deployment
+        underlying_model = config.llm_model
+        if self._router:
+            underlying_model = next(
+                (d.get("litellm_params", {}).get("model") for d in config.llm_deployments
+                 if d.get("model_name") == config.llm_model),
+                config.llm_model
+            )
+        model_lower = (underlying_model or "").lower()
+        self._uses_explicit_prompt_caching = "claude" in model_lower or model_lower.startswith("anthropic/")
+        # The model is fixed for the reviewer's lifetime, so capabilities are looked up once
+        self._supports_response_schema = _supports_response_schema(underlying_model)
+        self._supports_json_mode = _supports_json_mode(underlying_model, self._supports_response_schema)
+        if self._supports_response_schema:
+            logger.info(f"Requesting structured output (JSON schema) for model {config.llm_model}")
+        elif self._supports_json_mode:
+            logger.info(f"Requesting JSON object response_format for model {config.llm_model}")
+        self._base_kwargs = self._build_base_kwargs()
+
+    def _build_router(self) -> Optional[litellm.Router]:
         """
-        Creates the list of messages for the LLM API call using the prompt template.
+        Builds a LiteLLM Router over the configured deployments, or None to call the model directly.
+
+        The router spreads chunk reviews over every deployment of the llm_model group (e.g.
+        several API keys or regions) and moves on to the fallback groups when it keeps failing.
         """
-        if not self.prompt_template:
-            logger.error("Prompt template not loaded. Cannot create prompt messages.")
-            # Return a minimal prompt or raise an error
-            return [{"role": "user", "content": f"Review this code diff for {file_path}:\n{diff_chunk_content}"}]
+        if not self.config.llm_deployments:
+            return None
+        fallbacks = [{self.config.llm_model: self.config.llm_fallback_models}] if self.config.llm_fallback_models else []
+        try:
+            router = litellm.Router(
+                model_list=self.config.llm_deployments,
+                routing_strategy="least-busy",
+                num_retries=0, # Transient errors are retried with backoff by _call_llm
+                fallbacks=fallbacks,
+            )
+        except Exception as e:
+            logger.error(f"Invalid PLUGIN_LLM_DEPLOYMENTS, calling {self.config.llm_model} directly: {e}")
+            return None
+        logger.info(f"Routing LLM requests for '{self.config.llm_model}' across {len(self.config.llm_deployments)} deployment(s).")
+        return router
+
+    def _build_base_kwargs(self) -> Dict[str, Any]:
+        """LiteLLM request parameters shared by every chunk; only the messages vary per call."""
+        # Common parameters for all models
+        base_kwargs: Dict[str, Any] = {
+            "model": self.config.llm_model,
+            "temperature": self.config.temperature,  # Low by default for focused reviews
+            "top_p": self.config.top_p,
+            "max_tokens": self.config.max_tokens,  # Bounds response length, and with it decode time and cost
+            "stream": False,  # We want complete responses
+        }
+
+        # Enforce the review schema if the model supports structured outputs (LiteLLM maps it to
+        # a forced tool call for Anthropic), or at least JSON output if it supports JSON mode
+        if self._supports_response_schema:
+            base_kwargs["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": "ReviewResponse", "schema": _REVIEW_SCHEMA, "strict": True},
+            }
+        elif self._supports_json_mode:
+            base_kwargs["response_format"] = {"type": "json_object"}
+
+        if self._router:
+            # Credentials and endpoints are part of each deployment's litellm_params
+            return base_kwargs
+
+        # Add other common params like frequency_penalty, presence_penalty from config if defined
+        if self.config.llm_api_key:
+            base_kwargs["api_key"] = self.config.llm_api_key
+        if self.config.llm_api_base:
+            base_kwargs["api_base"] = self.config.llm_api_base
+
+        # Conditionally add api_version, primarily for Azure.
+        # Some non-Azure models might also accept a generic 'api_version' if provided.
+        if self.config.azure_api_version and self.config.llm_provider == "azure":
+            base_kwargs["api_version"] = self.config.azure_api_version
+        return base_kwargs
+
+    async def aclose(self):
+        """Closes the shared HTTP client and the checkpoint file. Call once all reviews are done."""
+        if self._checkpoint:
+            self._checkpoint.close()
+        if litellm.aclient_session is self._http_client:
+            litellm.aclient_session = None
+        await self._http_client.aclose()
 
+    async def __aenter__(self) -> "LLMReviewer":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    def _create_prompt_messages(self, file_path: str, diff_chunk_content: str) -> List[Dict[str, Any]]:
+        """
+        Creates the list of messages for the LLM API call using the prompt templates.
+
+        The system message is identical for every chunk; the file path, PR context and
+        diff only appear in the user message, after the cacheable prefix.
+        """
         pr_title = self.config.ci_pr_title or "N/A" # Fetched via SCM API or from CI env
         pr_description = self.config.ci_pr_description or "N/A" # Fetched via SCM API
 
-        try:
-            formatted_prompt_content = self.prompt_template.substitute(
-                file_to=file_path,
-                pr_title=pr_title,
-                pr_description=pr_description,
-                diff_chunk_content=diff_chunk_content
-            )
-        except KeyError as e:
-            logger.error(f"Missing placeholder in prompt template: {e}. Using raw diff content.")
-            # Fallback if template substitution fails
-            formatted_prompt_content = f"Review this code diff for {file_path} (PR: {pr_title}):\n{diff_chunk_content}"
+        # The template was validated on load, so every placeholder it uses is provided here
+        user_prompt_content = self.prompt_template.format_map({
+            "file_to": file_path,
+            "pr_title": pr_title,
+            "pr_description": pr_description,
+            "diff_chunk_content": diff_chunk_content,
+        })
+
+        system_content: Any = self.system_prompt
+        if self._uses_explicit_prompt_caching:
+            # Anthropic only caches prefixes marked with cache_control; OpenAI and Gemini cache identical prefixes automatically
+            system_content = [{"type": "text", "text": self.system_prompt, "cache_control": {"type": "ephemeral"}}]
 
-        # Create messages array with both system and user messages
         messages = [
-            {"role": "system", "content": formatted_prompt_content},
-            {"role": "user", "content": "Please review the code changes above and provide specific, actionable feedback in JSON format."}
+            {"role": "system", "content": system_content},
+            {"role": "user", "content": user_prompt_content}
         ]
         return messages
 
+    def _review_cache_key(self, user_prompt: str) -> str:
+        """Digest identifying a review request: the model, the system prompt and the rendered user prompt."""
+        digest = hashlib.blake2b(digest_size=32)
+        for part in (self.config.llm_model or "", self.system_prompt, user_prompt):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    async def _call_llm(self, kwargs_for_litellm: Dict[str, Any]) -> Any:
+        """
+        Calls the LLM, retrying transient failures with jittered exponential backoff.
+
+        Rate limits, connection errors and timeouts are retried up to _LLM_MAX_ATTEMPTS
+        times, waiting at least as long as the server's Retry-After when it sends one.
+
+        Raises:
+            The last error once attempts are exhausted, or any non-retryable error immediately.
+        """
+        for attempt in range(1, _LLM_MAX_ATTEMPTS + 1):
+            try:
+                if self._router:
+                    return await self._router.acompletion(**kwargs_for_litellm)
+                return await litellm.acompletion(**kwargs_for_litellm)
+            except _RETRYABLE_LLM_ERRORS as e:
+                if attempt == _LLM_MAX_ATTEMPTS:
+                    raise
+                delay = min(_LLM_BACKOFF_MAX, _LLM_BACKOFF_INITIAL * 2 ** (attempt - 1))
+                delay += random.uniform(0, delay / 2)
+                retry_after = _retry_after_seconds(e)
+                if retry_after is not None:
+                    delay = max(delay, min(retry_after, _LLM_RETRY_AFTER_MAX))
+                logger.warning(f"Transient LLM error ({type(e).__name__}), retrying in {delay:.1f}s "
+                               f"(attempt {attempt}/{_LLM_MAX_ATTEMPTS}): {e}")
+                await asyncio.sleep(delay)
+
+    async def iter_reviews_for_chunks(
+        self, chunks: List[Tuple[str, str]]
+    ) -> AsyncIterator[Tuple[int, Union[List[Dict[str, Any]], Exception]]]:
+        """
+        Reviews many diff chunks concurrently, yielding each result as soon as it is ready.
+
+        At most `config.llm_concurrency` requests are in flight at once and at most
+        `config.llm_qps` are started per second, to stay clear of provider rate limits.
+
+        Args:
+            chunks: (file_path, diff_chunk_content) pairs to review.
+
+        Yields:
+            (index, result) in completion order, where index is the chunk's position in
+            `chunks` and result is the review list from get_review_for_chunk, or the
+            exception raised while reviewing that chunk.
+        """
+        semaphore = asyncio.Semaphore(max(1, self.config.llm_concurrency))
+        bucket = _TokenBucket(self.config.llm_qps) if self.config.llm_qps > 0 else None
+
+        async def review(index: int, file_path: str, diff_chunk_content: str):
+            async with semaphore:
+                if bucket:
+                    await bucket.acquire()
+                try:
+                    return index, await self.get_review_for_chunk(file_path, diff_chunk_content)
+                except Exception as e:
+                    return index, e
+
+        tasks = [
+            asyncio.ensure_future(review(index, file_path, content))
+            for index, (file_path, content) in enumerate(chunks)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # The consumer stopped early (or failed); don't leave reviews running
+            for task in tasks:
+                task.cancel()
+
+    async def get_reviews_for_chunks(
+        self, chunks: List[Tuple[str, str]]
+    ) -> List[Union[List[Dict[str, Any]], Exception]]:
+        """
+        Reviews many diff chunks concurrently, with the limits of iter_reviews_for_chunks.
+
+        Args:
+            chunks: (file_path, diff_chunk_content) pairs to review.
+
+        Returns:
+            One entry per input chunk, in the same order: the review list from
+            get_review_for_chunk, or the exception raised while reviewing that chunk.
+        """
+        results: List[Union[List[Dict[str, Any]], Exception]] = [[] for _ in chunks]
+        async for index, result in self.iter_reviews_for_chunks(chunks):
+            results[index] = result
+        return results
+
     async def get_review_for_chunk(self, file_path: str, diff_chunk_content: str) -> List[Dict[str, Any]]:
         """
         Gets AI review comments for a specific diff chunk.
@@ -94,67 +521,43 @@ class LLMReviewer:
             logger.error("LLM model is not configured. Cannot get review.")
             return []
 
+        # Binary and metadata-only changes never get here: the parser drops files without hunks,
+        # and review_pr skips hunks without DiffChunk.has_reviewable_changes
+        if not diff_chunk_content.strip():
+            logger.info(f"Skipping LLM review for {file_path}: empty diff chunk.")
+            return []
+
         messages = self._create_prompt_messages(file_path, diff_chunk_content)
 
-        kwargs_for_litellm: Dict[str, Any] = {
-            "model": self.config.llm_model,
-            "messages": messages,
-            "temperature": 0.3,  # Lower temp for more focused reviews
-            "max_tokens": 2048,  # Generous limit for detailed reviews
-            "stream": False,  # We want complete responses
-        }
+        cache_key = self._review_cache_key(messages[-1]["content"])
+        cached_reviews = self._review_cache.get(cache_key)
+        if cached_reviews is None and self._disk_cache:
+            cached_reviews = self._disk_cache.get(cache_key)
+            if cached_reviews is not None:
+                self._review_cache[cache_key] = cached_reviews
+        if cached_reviews is not None:
+            logger.debug("Reusing cached review for identical chunk in %s.", file_path)
+            return [dict(review) for review in cached_reviews]
 
-        # Common parameters for all models
-        kwargs_for_litellm = {
-            "model": self.config.llm_model,
-            "messages": messages,
-            "temperature": 0.3,  # Lower temp for more focused reviews
-        }
+        kwargs_for_litellm = {**self._base_kwargs, "messages": messages}
 
-        # Add other common params like frequency_penalty, presence_penalty from config if defined
-        if self.config.llm_api_key:
-            kwargs_for_litellm["api_key"] = self.config.llm_api_key
-        if self.config.llm_api_base:
-            kwargs_for_litellm["api_base"] = self.config.llm_api_base
-        
-        # Conditionally add api_version, primarily for Azure.
-        # Some non-Azure models might also accept a generic 'api_version' if provided.
-        if self.config.azure_api_version and (self.config.llm_model and "azure" in self.config.llm_model.lower()):
-            kwargs_for_litellm["api_version"] = self.config.azure_api_version
-        
-        # Enforce JSON output if the model supports it (based on model name heuristic)
-        # This needs to be robustly checked against LiteLLM's capabilities for each model.
-        # For now, a simple heuristic:
-        model_lower = self.config.llm_model.lower()
-        if "gpt-4" in model_lower or \
-           "gpt-3.5-turbo-1106" in model_lower or \
-           "claude-3" in model_lower or \
-           "gemini-1.5" in model_lower: # Add other known JSON-mode models
-            try:
-                kwargs_for_litellm["response_format"] = {"type": "json_object"}
-                logger.info(f"Requesting JSON object response_format for model {self.config.llm_model}")
-            except Exception as e_rf: # Should not happen with LiteLLM's dict param
-                 logger.warning(f"Model {self.config.llm_model} might not support 'response_format' via kwargs. Error: {e_rf}")
-        
         logger.info(f"Sending request to LLM for file: {file_path}, model: {self.config.llm_model}")
         if logger.isEnabledFor(logging.DEBUG):
-            # Avoid logging potentially large messages payload unless DEBUG is on
-            debug_kwargs = {k: (v if k != "messages" else "[MESSAGES_TRUNCATED]") for k,v in kwargs_for_litellm.items()}
-            logger.debug(f"LiteLLM Request kwargs (messages truncated): {json.dumps(debug_kwargs, indent=2, default=str)}")
+            # Avoid logging potentially large messages payload (and the API key) unless DEBUG is on
+            debug_kwargs = {
+                k: ("[MESSAGES_TRUNCATED]" if k == "messages" else "[REDACTED]" if k == "api_key" else v)
+                for k, v in kwargs_for_litellm.items()
+            }
+            logger.debug("LiteLLM Request kwargs (messages truncated): %s", debug_kwargs)
             # For very detailed debugging of messages:
-            # logger.debug(f"LiteLLM Request messages: {json.dumps(kwargs_for_litellm.get('messages'), indent=2)}")
-
+            # logger.debug("LiteLLM Request messages: %s", kwargs_for_litellm.get("messages"))
 
         llm_response_content: Optional[str] = None
         try:
-            response = litellm.completion(**kwargs_for_litellm)
-            
-            logger.info(f"Raw LLM response object: {response}")
-            logger.info(f"Response choices: {response.choices if hasattr(response, 'choices') else 'No choices'}")            
-            if hasattr(response, 'choices') and response.choices:
-                logger.info(f"First choice message: {response.choices[0].message if hasattr(response.choices[0], 'message') else 'No message'}")            
-            if logger.isEnabledFor(logging.DEBUG):
-                 logger.debug(f"Raw LLM response object: {response}")
+            response = await self._call_llm(kwargs_for_litellm)
+
+            # The response repr walks the whole object; only build it when DEBUG is on
+            logger.debug("Raw LLM response object: %s", response)
 
             if response and response.choices and response.choices[0].message and response.choices[0].message.content:
                 llm_response_content = response.choices[0].message.content.strip()
@@ -166,27 +569,21 @@ class LLMReviewer:
                 logger.warning("LLM returned empty content.")
                 return []
 
-            logger.debug(f"LLM response content to parse: {llm_response_content}")
-            parsed_response = json.loads(llm_response_content)
-            # Handle both direct reviews and wrapped in additionalProperties
-            reviews = parsed_response.get("reviews", []) or parsed_response.get("additionalProperties", {}).get("reviews", [])
-            
-            valid_reviews = []
-            for item in reviews:
-                if isinstance(item, dict) and "lineNumber" in item and "reviewComment" in item:
-                    try:
-                        item["lineNumber"] = int(str(item["lineNumber"])) # Ensure it's int
-                        item["reviewComment"] = str(item["reviewComment"])
-                        valid_reviews.append(item)
-                    except (ValueError, TypeError) as e:
-                        logger.warning(f"Invalid lineNumber or reviewComment type in review item: {item}. Error: {e}")
-                else:
-                    logger.warning(f"Malformed review item from LLM (expected dict with keys): {item}")
-            
+            logger.debug("LLM response content to parse: %s", llm_response_content)
+            valid_reviews, well_formed = _parse_reviews(llm_response_content, self._supports_response_schema)
+
             if valid_reviews:
                  logger.info(f"Received {len(valid_reviews)} review suggestions from LLM for {file_path}.")
             else:
                  logger.info(f"No actionable review suggestions received or parsed from LLM for {file_path}.")
+            # Only complete responses are reused; a malformed one is asked for again next time
+            # rather than replayed for the lifetime of the cache
+            if well_formed:
+                self._review_cache[cache_key] = [dict(review) for review in valid_reviews]
+                if self._disk_cache:
+                    self._disk_cache.set(cache_key, valid_reviews)
+                if self._checkpoint:
+                    self._checkpoint.append(cache_key, valid_reviews)
             return valid_reviews
 
         except json.JSONDecodeError as e:
@@ -198,8 +595,7 @@ class LLMReviewer:
             logger.error(f"LiteLLM API Connection Error: {e}")
             return []
         except litellm.exceptions.RateLimitError as e: # type: ignore
-            logger.error(f"LiteLLM Rate Limit Error: {e}")
-            # TODO: Consider implementing retry logic here for transient errors like rate limits
+            logger.error(f"LiteLLM Rate Limit Error (retries exhausted): {e}")
             return []
         except litellm.exceptions.APIError as e: # type: ignore
             logger.error(f"LiteLLM API Error (Status: {e.status_code}, Message: {e.message}, Raw Response: {e.response.text if e.response else 'N/A'})")
@@ -1,30 +1,43 @@
 # src/drone_ai_pr_reviewer/main.py
+from __future__ import annotations
+
+import bisect
+import configparser
+import functools
 import os
+import re
 import sys
 import asyncio # For running async LLM calls
 import logging
 import subprocess # For git commands
-from typing import List, Dict, Any, Optional, TYPE_CHECKING
-from urllib.parse import urlparse
-from dotenv import load_dotenv # For local development using .env file
+from pathlib import Path
+from collections.abc import Iterator
+from typing import TYPE_CHECKING
 
 from .plugin_config import load_plugin_config, PluginConfig
 from .llm_auth_helper import setup_liteLLM_provider_specific_env
-from .llm_reviewer import LLMReviewer
-from .scm_client import BaseSCMClient # Using BaseSCMClient for now
+from .scm_client import BaseSCMClient, DIFF_STREAM_ERRORS # Using BaseSCMClient for now
 from .diff_parser import parse_diff_text
 from .models import ReviewComment, DiffFile # Import DiffFile for type hinting
-from .utils.file_filter import filter_files_by_patterns
+from .utils.constants import LLM_BATCH_MAX_CHARS, LLM_MAX_CHUNK_CHARS, REVIEW_COMMENT_BATCH_SIZE
+
+# LLMReviewer pulls in LiteLLM, which takes seconds to import; it is only imported
+# once a run is known to be a PR review, so other builds exit quickly
+if TYPE_CHECKING:
+    from .llm_reviewer import LLMReviewer
 
 # Global logger for the module
 logger = logging.getLogger("drone_ai_pr_reviewer") # Use a named logger
 
+# Owner (possibly a nested group path) and name from an HTTP(S) or SSH repository URL
+_REPO_URL_RE = re.compile(r"^(?:https?://[^/]+/|(?:ssh://)?[\w.-]+@[^:/]+[:/])(?P<owner>.+?)/(?P<name>[^/]+?)(?:\.git)?/?$")
+
 def setup_logging(log_level_str: str):
     """Configures basic logging for the plugin."""
     numeric_level = getattr(logging, log_level_str.upper(), None)
     if not isinstance(numeric_level, int):
         numeric_level = logging.INFO
-        logger.warning(f"Invalid log level '{log_level_str}'. Defaulting to INFO.")
+        logger.warning("Invalid log level '%s'. Defaulting to INFO.", log_level_str)
     
     # Basic configuration, can be made more sophisticated
     logging.basicConfig(
@@ -33,72 +46,36 @@ def setup_logging(log_level_str: str):
         datefmt='%Y-%m-%d %H:%M:%S'
     )
 
-def validate_config(config: PluginConfig) -> bool:
-    """Validate that all required configuration is present."""
-    required_vars = [
-        "llm_provider",
-        "llm_model",
-        "ci_repo_owner",
-        "ci_repo_name",
-        "ci_pr_number"
-    ]
-    
-    missing = [var for var in required_vars if not getattr(config, var, None)]
-    if missing:
-        logger.error(f"Missing required configuration: {missing}")
-        return False
-    
-    # Validate LLM provider
-    if config.llm_provider not in ["openai", "azure", "ollama", "openrouter", "novita"]:
-        logger.error(f"Invalid LLM provider: {config.llm_provider}")
-        return False
-    
-    return True
-
-def main_cli():
-    """Main entry point for the plugin."""
+@functools.lru_cache(maxsize=8)
+def _find_git_root(start_dir: str) -> str | None:
+    """Returns the closest directory at or above start_dir that contains .git, or None."""
+    start = Path(start_dir).resolve()
+    for directory in (start, *start.parents):
+        if (directory / ".git").exists():
+            return str(directory)
+    return None
+
+def _read_git_config_remote_url(repo_path: str, remote_name: str) -> str | None:
+    """Reads a remote's URL straight from .git/config, or returns None if it is not there."""
+    config_path = os.path.join(repo_path, ".git", "config")
+    # Git config repeats keys (e.g. several 'fetch' lines), hence strict=False
+    parser = configparser.ConfigParser(strict=False, interpolation=None)
     try:
-        # Load config
-        config = load_plugin_config()
-        
-        # Validate config
-        if not validate_config(config):
-            logger.error("Configuration validation failed. Exiting.")
-            sys.exit(1)
-            
-        # Setup logging
-        setup_logging(config.log_level or "INFO")
-        
-        # Setup LLM provider
-        setup_liteLLM_provider_specific_env(config)
-        
-        # Create instances
-        llm_reviewer = LLMReviewer(config)
-        scm_client = BaseSCMClient(config)
-        
-        # Populate CI info
-        populate_ci_environment_info(config, scm_client)
-        
-        # Run review
-        success = asyncio.run(review_pr(config, scm_client, llm_reviewer))
-        
-        if not success:
-            logger.error("PR review failed.")
-            sys.exit(1)
-            
-    except Exception as e:
-        logger.error(f"Fatal error in main: {e}", exc_info=True)
-        sys.exit(1)
+        if not parser.read(config_path, encoding="utf-8"):
+            return None
+        return parser[f'remote "{remote_name}"']["url"].strip() or None
+    except (configparser.Error, KeyError, UnicodeDecodeError):
+        return None
 
-if __name__ == "__main__":
-    main_cli()
-    # Set LiteLLM's logger level as well if desired, or control its verbosity
-    # For example, to reduce LiteLLM's own logging:
-    # litellm_logger = logging.getLogger("LiteLLM")
-    # litellm_logger.setLevel(logging.WARNING) # Or higher to make it less verbose
-
-def get_git_remote_url(remote_name: str = "origin") -> Optional[str]:
-    """Gets the URL of a given git remote using git command."""
+@functools.lru_cache(maxsize=8)
+def get_git_remote_url(remote_name: str = "origin") -> str | None:
+    """
+    Gets the URL of a given git remote.
+
+    The URL is read from .git/config directly; git is only run (up to two
+    subprocesses) when that file is missing or has no such remote, e.g. for
+    worktrees. The result is cached, as remotes don't change during a run.
+    """
     try:
         # Check if .git directory exists
         # This logic might need to be more robust depending on where the script is run from
@@ -107,37 +84,35 @@ def get_git_remote_url(remote_name: str = "origin") -> Optional[str]:
         git_dir_path = os.path.join(repo_path, ".git")
 
         if not os.path.isdir(git_dir_path):
-            logger.warning(f".git directory not found at {git_dir_path}. Cannot run git commands to get remote URL.")
+            logger.warning(".git directory not found at %s. Cannot run git commands to get remote URL.", git_dir_path)
             # Attempt to find .git in parent directories as a fallback for local testing
-            current_dir = os.getcwd()
-            found_git_root = None
-            while current_dir != os.path.dirname(current_dir): # Stop at root
-                if os.path.exists(os.path.join(current_dir, ".git")):
-                    found_git_root = current_dir
-                    break
-                current_dir = os.path.dirname(current_dir)
+            found_git_root = _find_git_root(os.getcwd())
             if not found_git_root:
                 logger.warning("Could not find .git directory in current or parent paths.")
                 return None
             repo_path = found_git_root # Execute git command from this found root
 
+        url = _read_git_config_remote_url(repo_path, remote_name)
+        if url:
+            return url
+
         cmd = ["git", "remote", "get-url", remote_name]
         result = subprocess.run(cmd, capture_output=True, text=True, check=False, cwd=repo_path)
         if result.returncode == 0:
             return result.stdout.strip()
         else:
-            logger.warning(f"Failed to get URL for remote '{remote_name}' (stderr: {result.stderr.strip()}). Trying 'git config'.")
+            logger.warning("Failed to get URL for remote '%s' (stderr: %s). Trying 'git config'.", remote_name, result.stderr.strip())
             cmd_config = ["git", "config", "--get", f"remote.{remote_name}.url"]
             result_config = subprocess.run(cmd_config, capture_output=True, text=True, check=False, cwd=repo_path)
             if result_config.returncode == 0:
                 return result_config.stdout.strip()
-            logger.error(f"Failed to get URL for remote '{remote_name}' using 'git config' as well (stderr: {result_config.stderr.strip()}).")
+            logger.error("Failed to get URL for remote '%s' using 'git config' as well (stderr: %s).", remote_name, result_config.stderr.strip())
             return None
     except FileNotFoundError:
         logger.error("'git' command not found. Ensure Git is installed and in PATH.")
         return None
     except Exception as e:
-        logger.error(f"Exception while getting git remote URL: {e}", exc_info=True)
+        logger.error("Exception while getting git remote URL: %s", e, exc_info=True)
         return None
 
 def populate_ci_environment_info(config: PluginConfig, scm_client: BaseSCMClient):
@@ -152,7 +127,7 @@ def populate_ci_environment_info(config: PluginConfig, scm_client: BaseSCMClient
     config.ci_repo_owner = os.getenv("DRONE_REPO_OWNER")
     config.ci_repo_name = os.getenv("DRONE_REPO_NAME")
     config.ci_repo_link = os.getenv("DRONE_REPO_LINK")
-    logger.info(f"Repository info: {config.ci_repo_owner}/{config.ci_repo_name}")
+    logger.info("Repository info: %s/%s", config.ci_repo_owner, config.ci_repo_name)
 
     # --- Event Type ---
     config.ci_event_name = os.getenv("DRONE_BUILD_EVENT")
@@ -163,7 +138,7 @@ def populate_ci_environment_info(config: PluginConfig, scm_client: BaseSCMClient
             config.ci_pr_number = int(pr_number_str)
             config.is_pr_event = True
         except ValueError:
-            logger.error(f"Invalid DRONE_PULL_REQUEST value: {pr_number_str}. Not a number.")
+            logger.error("Invalid DRONE_PULL_REQUEST value: %s. Not a number.", pr_number_str)
             config.is_pr_event = False
     else:
         config.is_pr_event = False
@@ -182,7 +157,7 @@ def populate_ci_environment_info(config: PluginConfig, scm_client: BaseSCMClient
         
     # Validate SHA format
     if not config.ci_head_sha or len(config.ci_head_sha) != 40 or not all(c in '0123456789abcdef' for c in config.ci_head_sha.lower()):
-        logger.error(f"Invalid head SHA format: {config.ci_head_sha}. Expected 40 hex characters.")
+        logger.error("Invalid head SHA format: %s. Expected 40 hex characters.", config.ci_head_sha)
         config.is_pr_event = False
         return
         
@@ -215,7 +190,7 @@ def populate_ci_environment_info(config: PluginConfig, scm_client: BaseSCMClient
         if fetched_base_sha:
             config.ci_base_sha = fetched_base_sha
         else:
-            logger.error(f"Failed to fetch head SHA for target branch '{config.ci_target_branch}'. Cannot determine diff base.")
+            logger.error("Failed to fetch head SHA for target branch '%s'. Cannot determine diff base.", config.ci_target_branch)
             config.is_pr_event = False
             return
 
@@ -224,15 +199,15 @@ def populate_ci_environment_info(config: PluginConfig, scm_client: BaseSCMClient
         config.ci_event_action = "synchronize"
         config.ci_base_sha = os.getenv("DRONE_COMMIT_BEFORE")
         if not config.ci_base_sha or config.ci_base_sha == "0000000000000000000000000000000000000000":
-            logger.error(f"Invalid base SHA: {config.ci_base_sha}. Expected 40 hex characters.")
+            logger.error("Invalid base SHA: %s. Expected 40 hex characters.", config.ci_base_sha)
             config.is_pr_event = False
             return
         if config.ci_base_sha == config.ci_head_sha:
-            logger.info(f"Base SHA is same as Head SHA ({config.ci_head_sha}) for 'synchronize' event. No changes to review.")
+            logger.info("Base SHA is same as Head SHA (%s) for 'synchronize' event. No changes to review.", config.ci_head_sha)
             config.is_pr_event = False # Effectively no diff
             return
     else:
-        logger.info(f"Unhandled DRONE_BUILD_EVENT '{config.ci_event_name}' for PR review logic, or not a clear PR update (e.g. push without DRONE_PULL_REQUEST).")
+        logger.info("Unhandled DRONE_BUILD_EVENT '%s' for PR review logic, or not a clear PR update (e.g. push without DRONE_PULL_REQUEST).", config.ci_event_name)
         config.is_pr_event = False
         return
 
@@ -241,7 +216,7 @@ def populate_ci_environment_info(config: PluginConfig, scm_client: BaseSCMClient
         config.is_pr_event = False
         return
 
-    logger.info(f"Determined event action: {config.ci_event_action}, Base SHA: {config.ci_base_sha}, Head SHA: {config.ci_head_sha}")
+    logger.info("Determined event action: %s, Base SHA: %s, Head SHA: %s", config.ci_event_action, config.ci_base_sha, config.ci_head_sha)
 
     # --- Repository Info ---
     # Use environment variables directly
@@ -251,15 +226,17 @@ def populate_ci_environment_info(config: PluginConfig, scm_client: BaseSCMClient
     
     # Log repository info
     if config.ci_repo_owner and config.ci_repo_name:
-        logger.info(f"Repository info: {config.ci_repo_owner}/{config.ci_repo_name}")
+        logger.info("Repository info: %s/%s", config.ci_repo_owner, config.ci_repo_name)
     
     if not config.ci_repo_owner or not config.ci_repo_name:
-         # Fallback to direct DRONE variables if parsing failed
-        config.ci_repo_owner = config.ci_repo_owner or os.getenv("DRONE_REPO_OWNER")
-        config.ci_repo_name = config.ci_repo_name or os.getenv("DRONE_REPO_NAME")
+        # Fall back to the repository link (https://host/owner/name or git@host:owner/name.git)
+        match = _REPO_URL_RE.match(config.ci_repo_link or "")
+        if match:
+            config.ci_repo_owner = config.ci_repo_owner or match["owner"]
+            config.ci_repo_name = config.ci_repo_name or match["name"]
         if config.ci_repo_owner and config.ci_repo_name:
             config.ci_repo_full_name = f"{config.ci_repo_owner}/{config.ci_repo_name}"
-            logger.info(f"Using direct DRONE_REPO_OWNER/NAME: Owner='{config.ci_repo_owner}', Name='{config.ci_repo_name}'.")
+            logger.info("Using repository from DRONE_REPO_LINK: Owner='%s', Name='%s'.", config.ci_repo_owner, config.ci_repo_name)
         else:
             logger.error("Could not determine repository owner and name. SCM operations will fail.")
             config.is_pr_event = False
@@ -280,6 +257,63 @@ def populate_ci_environment_info(config: PluginConfig, scm_client: BaseSCMClient
     logger.info("CI environment information population complete.")
 
 
+def _batch_file_chunks(diff_file: DiffFile) -> tuple[list[tuple[str, list[int], list[int]]], int]:
+    """
+    Packs the reviewable hunks of a file into as few LLM requests as LLM_BATCH_MAX_CHARS allows.
+
+    Within a request, each hunk's lines are numbered after the previous hunk's, so line
+    numbers in the response are unambiguous; _locate_hunk_line maps them back. Hunks that are
+    not sent (nothing to review, or over LLM_MAX_CHUNK_CHARS) take no line numbers.
+
+    Returns:
+        ([(diff_content, line_offsets, chunk_indices)], skipped_chunks): one entry per request,
+        with the offset each of its hunks was numbered from and that hunk's index in
+        diff_file.chunks, and the number of hunks that were not sent.
+    """
+    batches: list[tuple[str, list[int], list[int]]] = []
+    skipped_chunks = 0
+    batch_parts: list[str] = []
+    batch_offsets: list[int] = []
+    batch_indices: list[int] = []
+    batch_chars = 0
+    next_offset = 0
+    for chunk_idx, chunk in enumerate(diff_file.chunks):
+        if not chunk.has_reviewable_changes:
+            logger.info("  Skipping chunk %s/%s (header: %s): only deletions or blank lines", chunk_idx+1, len(diff_file.chunks), chunk.header.strip())
+            skipped_chunks += 1
+            continue
+        if len(chunk.content_for_llm) > LLM_MAX_CHUNK_CHARS:
+            logger.info("  Skipping chunk %s/%s (header: %s): %s characters exceeds the %s character limit", chunk_idx+1, len(diff_file.chunks), chunk.header.strip(), len(chunk.content_for_llm), LLM_MAX_CHUNK_CHARS)
+            skipped_chunks += 1
+            continue
+        logger.info("  Reviewing chunk %s/%s (header: %s)", chunk_idx+1, len(diff_file.chunks), chunk.header.strip())
+
+        chunk_text = chunk.format_for_llm(next_offset) if next_offset else chunk.content_for_llm
+        if batch_parts and batch_chars + len(chunk_text) > LLM_BATCH_MAX_CHARS:
+            batches.append(("\n\n".join(batch_parts), batch_offsets, batch_indices))
+            batch_parts, batch_offsets, batch_indices, batch_chars, next_offset = [], [], [], 0, 0
+            chunk_text = chunk.content_for_llm
+        batch_parts.append(chunk_text)
+        batch_offsets.append(next_offset)
+        batch_indices.append(chunk_idx)
+        batch_chars += len(chunk_text)
+        next_offset += chunk.llm_line_count
+    if batch_parts:
+        batches.append(("\n\n".join(batch_parts), batch_offsets, batch_indices))
+    return batches, skipped_chunks
+
+def _locate_hunk_line(line_offsets: list[int], line_number: int) -> tuple[int, int] | None:
+    """
+    Maps a line number of a batched request back to (hunk index in the request, line within that hunk).
+
+    Returns None for line numbers below the first hunk's.
+    """
+    # A hunk numbered from offset o holds lines o+1 .. next offset
+    hunk_idx = bisect.bisect_left(line_offsets, line_number) - 1
+    if hunk_idx < 0:
+        return None
+    return hunk_idx, line_number - line_offsets[hunk_idx]
+
 async def review_pr(config: PluginConfig, scm_client: BaseSCMClient, llm_reviewer: LLMReviewer) -> bool:
     """
     Main Pull Request review process.
@@ -288,110 +322,125 @@ async def review_pr(config: PluginConfig, scm_client: BaseSCMClient, llm_reviewe
         logger.info("Not a valid PR event for review. Skipping.")
         return True # Not a failure, just nothing to do.
 
-    # Fetch full PR details (especially description, and canonical title)
-    logger.info(f"Fetching details for PR #{config.ci_pr_number}...")
-    if not scm_client.get_pr_details(): # This updates config.ci_pr_description and config.ci_pr_title
-        logger.error(f"Failed to fetch PR details for PR #{config.ci_pr_number}. Cannot proceed with full context.")
-        # Decide if to proceed with potentially missing title/description or fail
-        # For now, we'll proceed, LLMReviewer uses "N/A" if they are None.
-    
-    # Get diff text
-    diff_text: Optional[str] = None
+    # Fetch full PR details (especially description, and canonical title) and the diff at
+    # the same time; the SCM client is blocking, so each request runs in a worker thread
+    logger.info("Fetching details for PR #%s...", config.ci_pr_number)
+    details_task = asyncio.create_task(asyncio.to_thread(scm_client.get_pr_details)) # Updates config.ci_pr_description and config.ci_pr_title
+
+    # Get the diff as a stream of raw lines; it is parsed while it downloads and never held whole
+    diff_lines: Iterator[bytes] | None = None
     if config.is_pr_opened_event:
-        logger.info(f"Fetching full diff for opened PR #{config.ci_pr_number}...")
-        diff_text = scm_client.get_pr_diff()
+        logger.info("Fetching full diff for opened PR #%s...", config.ci_pr_number)
+        diff_lines = await asyncio.to_thread(scm_client.stream_pr_diff)
     elif config.is_pr_synchronize_event:
-        logger.info(f"Fetching diff for synchronized PR #{config.ci_pr_number} (Base: {config.ci_base_sha}, Head: {config.ci_head_sha})...")
-        diff_text = scm_client.compare_commits_diff()
-    
-    if not diff_text:
+        logger.info("Fetching diff for synchronized PR #%s (Base: %s, Head: %s)...", config.ci_pr_number, config.ci_base_sha, config.ci_head_sha)
+        diff_lines = await asyncio.to_thread(scm_client.stream_commits_diff)
+
+    if diff_lines is None:
+        await details_task # Nothing to review, but don't leave the request running
         logger.warning("No diff text could be retrieved. Skipping review.")
         return True # No diff means nothing to review, not a failure.
 
-    if logger.isEnabledFor(logging.DEBUG):
-        logger.debug(f"Retrieved diff text (first 1000 chars):\n{diff_text[:1000]}")
+    # Parse diff, dropping files that do not match the include/exclude patterns while parsing;
+    # the patterns were compiled when the config was loaded and each file path is matched a single time.
+    # Reading and parsing large diffs is blocking, so it runs in a worker thread off the event loop,
+    # started before the details are awaited so parsing overlaps the details request.
+    parse_task = asyncio.create_task(asyncio.to_thread(
+        parse_diff_text,
+        diff_lines,
+        path_filter=config.path_filter
+    ))
+
+    # The details are needed before any prompt is built
+    if not await details_task:
+        logger.error("Failed to fetch PR details for PR #%s. Cannot proceed with full context.", config.ci_pr_number)
+        # Decide if to proceed with potentially missing title/description or fail
+        # For now, we'll proceed, LLMReviewer uses "N/A" if they are None.
 
-    # Parse diff
-    config.diff_files = parse_diff_text(diff_text)
+    # The diff downloads while it is parsed, so a dropped connection surfaces here
+    try:
+        config.diff_files = await parse_task
+    except DIFF_STREAM_ERRORS as e:
+        logger.warning("The diff could not be fully retrieved (%s). Skipping review.", e)
+        return True # Same as no diff at all: nothing reliable to review, not a failure.
+    logger.debug("Parsed %d files from the diff.", len(config.diff_files))
     if not config.diff_files:
-        logger.info("No reviewable files found after parsing diff. Skipping review.")
+        logger.info("No reviewable files found after parsing and filtering diff. Skipping review.")
         return True
 
-    # Filter files based on include/exclude patterns
-    display_paths = [file.display_path for file in config.diff_files if file.display_path]
-    
-    filtered_paths = filter_files_by_patterns(
-        display_paths,
-        include_patterns=config.include_patterns,
-        exclude_patterns=config.exclude_patterns
-    )
-    
-    final_files_to_review = [
-        file for file in config.diff_files 
-        if file.display_path and file.display_path in filtered_paths
-    ]
-    
-    if filtered_paths:
-        logger.info(f"Found {len(filtered_paths)} files to review after filtering.")
-        logger.info(f"Included files: {filtered_paths}")
+    final_files_to_review = config.diff_files
+    logger.info("Found %s files to review after filtering.", len(final_files_to_review))
+    logger.info("Included files: %s", [file.display_path for file in final_files_to_review])
     # Process each file
-    review_tasks = []  # Initialize list to store review tasks
-    all_review_comments = []  # Initialize list to store all review comments
+    review_tasks = []  # (file_path, diff_content) pairs, one per LLM request
+    task_hunks = []  # Per request, its file and the line offsets and chunk indices of its hunks
+    pending_comments: list[ReviewComment] = []  # Comments not yet handed to the SCM
+    post_tasks = []  # SCM posts running in worker threads while chunks are still being reviewed
+    total_comments = 0
+    skipped_chunks = 0
     
     for diff_file in final_files_to_review:
-        logger.info(f"Processing file for review: {diff_file.display_path}")
-        
-        # Process each chunk in the file
-        for chunk_idx, chunk in enumerate(diff_file.chunks):
-            logger.info(f"  Reviewing chunk {chunk_idx+1}/{len(diff_file.chunks)} (header: {chunk.header.strip()})")
-            
-            # Create review task for this chunk
-            task = llm_reviewer.get_review_for_chunk(
-                file_path=diff_file.display_path,
-                diff_chunk_content=chunk.content_for_llm
-            )
-            review_tasks.append((task, diff_file.display_path)) # Store path for context
-
-    # Gather results from all chunk review tasks
-    # This will run them concurrently
-    llm_results_with_context = await asyncio.gather(*(task for task, _ in review_tasks), return_exceptions=True)
-
-    for i, result_or_exc in enumerate(llm_results_with_context):
-        original_file_path = review_tasks[i][1]
+        logger.info("Processing file for review: %s", diff_file.display_path)
+        batches, skipped = _batch_file_chunks(diff_file)
+        skipped_chunks += skipped
+        for diff_content, line_offsets, chunk_indices in batches:
+            review_tasks.append((diff_file.display_path, diff_content))
+            task_hunks.append((diff_file, line_offsets, chunk_indices))
+
+    logger.info("Sending %s LLM review request(s); %s chunk(s) skipped.", len(review_tasks), skipped_chunks)
+
+    # Review all chunks concurrently, bounded by PLUGIN_LLM_CONCURRENCY in-flight requests
+    # and PLUGIN_LLM_QPS request starts per second so large PRs don't trip provider rate limits.
+    # Results are handled as each chunk finishes, and full batches of comments are posted
+    # right away instead of waiting for the slowest chunk.
+    async for i, result_or_exc in llm_reviewer.iter_reviews_for_chunks(review_tasks):
+        original_file_path = review_tasks[i][0]
+        diff_file, line_offsets, chunk_indices = task_hunks[i]
         if isinstance(result_or_exc, Exception):
-            logger.error(f"Error reviewing chunk for file {original_file_path}: {result_or_exc}", exc_info=result_or_exc)
+            logger.error("Error reviewing chunk for file %s: %s", original_file_path, result_or_exc, exc_info=result_or_exc)
         elif isinstance(result_or_exc, list): # Expected list of dicts
             for review_item_dict in result_or_exc:
                 # Convert dict to ReviewComment object
-                # TODO: Implement robust mapping of LLM's lineNumber to SCM comment position
-                # This is a placeholder, assuming LLM returns absolute line number in new file.
-                # SCMs often need diff-relative line numbers or positions.
-                try:
-                    comment_line = int(str(review_item_dict.get("lineNumber")))
-                    comment_body = str(review_item_dict.get("reviewComment", "")).strip()
-                    if comment_body: # Only add if there's a comment
-                        all_review_comments.append(
-                            ReviewComment(
-                                file_path=original_file_path,
-                                line_number=comment_line,
-                                body=comment_body
-                            )
-                        )
-                except (ValueError, TypeError) as e:
-                     logger.warning(f"Could not create ReviewComment from LLM output item {review_item_dict} for file {original_file_path}: {e}")
+                # Items are validated when the LLM response is parsed: lineNumber is an int, reviewComment a str
+                comment_body = review_item_dict["reviewComment"].strip()
+                if not comment_body: # Only add if there's a comment
+                    continue
+                # The LLM answers with the line labels of the request; map them to a hunk, then to
+                # the position in the file's diff the SCM places comments by
+                located = _locate_hunk_line(line_offsets, review_item_dict["lineNumber"])
+                position = located and diff_file.diff_position(chunk_indices[located[0]], located[1])
+                if not position:
+                    logger.warning("Dropping review comment on line %s of %s: not a line of the reviewed hunks", review_item_dict["lineNumber"], original_file_path)
+                    continue
+                pending_comments.append(
+                    ReviewComment(
+                        file_path=original_file_path,
+                        line_number=located[1],
+                        body=comment_body,
+                        position=position
+                    )
+                )
         else:
-            logger.warning(f"Unexpected result type from LLM review for file {original_file_path}: {type(result_or_exc)}")
+            logger.warning("Unexpected result type from LLM review for file %s: %s", original_file_path, type(result_or_exc))
+
+        if len(pending_comments) >= REVIEW_COMMENT_BATCH_SIZE:
+            # The SCM client is blocking; post from a worker thread so reviews keep flowing
+            post_tasks.append(asyncio.create_task(asyncio.to_thread(scm_client.post_review_comments, pending_comments)))
+            total_comments += len(pending_comments)
+            pending_comments = []
 
+    if pending_comments:
+        post_tasks.append(asyncio.create_task(asyncio.to_thread(scm_client.post_review_comments, pending_comments)))
+        total_comments += len(pending_comments)
 
-    if not all_review_comments:
+    if not post_tasks:
         logger.info("No review comments generated by the LLM across all files/chunks.")
         return True
 
-    logger.info(f"Total review comments to post: {len(all_review_comments)}")
-    
-    # Post comments to SCM
-    success = scm_client.post_review_comments(all_review_comments)
+    # Wait for every batch to reach the SCM
+    success = all(await asyncio.gather(*post_tasks))
     if success:
+        logger.info("Total review comments posted: %s in %s review(s)", total_comments, len(post_tasks))
         logger.info("Successfully posted all review comments to SCM.")
     else:
         logger.error("Failed to post one or more review comments to SCM.")
@@ -408,7 +457,7 @@ async def async_main():
     setup_logging(config.log_level) # Configure logging early
 
     logger.info("Starting AI PR Reviewer Plugin...")
-    logger.info(f"Plugin Version: {getattr(__import__('drone_ai_pr_reviewer'), '__version__', 'N/A')}") # Get version from __init__
+    logger.info("Plugin Version: %s", getattr(__import__('drone_ai_pr_reviewer'), '__version__', 'N/A')) # Get version from __init__
 
     # Validate essential configurations
     if not config.llm_model:
@@ -424,33 +473,49 @@ async def async_main():
     # Initialize SCM client
     # TODO: Implement SCM provider factory if supporting multiple SCMs
     # For now, BaseSCMClient is used, which has GitHub-like defaults.
-    scm_client = BaseSCMClient(config)
-
-    # Populate CI environment details into config (owner, repo, PR num, SHAs, etc.)
-    # This might make SCM calls (e.g., to get target branch head)
-    populate_ci_environment_info(config, scm_client)
-
-    # Initialize LLM reviewer
-    llm_reviewer = LLMReviewer(config)
-    
+    # The client's pooled SCM connections are closed once the review is done
+    with BaseSCMClient(config) as scm_client:
+        # Populate CI environment details into config (owner, repo, PR num, SHAs, etc.)
+        # This might make SCM calls (e.g., to get target branch head)
+        populate_ci_environment_info(config, scm_client)
+        if not config.is_pr_event:
+            logger.info("Not a valid PR event for review. Skipping.")
+            return 0
+
+        # Initialize LLM reviewer
+        from .llm_reviewer import LLMReviewer
+        # The reviewer's pooled HTTP client is closed once the review is done
+        async with LLMReviewer(config) as llm_reviewer:
+            try:
+                success = await review_pr(config, scm_client, llm_reviewer)
+                logger.info("Plugin execution finished. Success: %s", success)
+                return 0 if success else 1
+            except Exception as e:
+                logger.critical("Unhandled exception in plugin execution: %s", e, exc_info=True)
+                return 1 # General failure
+
+def _install_uvloop():
+    """Makes asyncio.run use uvloop, which schedules the many concurrent LLM requests with less overhead, if it is installed."""
     try:
-        success = await review_pr(config, scm_client, llm_reviewer)
-        logger.info(f"Plugin execution finished. Success: {success}")
-        return 0 if success else 1
-    except Exception as e:
-        logger.critical(f"Unhandled exception in plugin execution: {e}", exc_info=True)
-        return 1 # General failure
+        import uvloop
+    except ImportError:
+        return
+    uvloop.install()
+    logger.debug("Using uvloop event loop.")
 
 def main_cli():
     """
-    CLI entry point. Loads .env for local dev.
+    CLI entry point (the drone-ai-pr-reviewer console script). Loads .env for local dev,
+    then runs async_main, which loads the configuration once and does the review.
     """
     # Load .env file if it exists (for local development)
     # In a real CI environment, variables are injected by the system.
     if os.path.exists(".env"):
+        from dotenv import load_dotenv # Only needed for local development
         logger.info("Found .env file, loading environment variables for local development.")
         load_dotenv(override=True) # Override existing env vars if .env specifies them
     elif os.path.exists("../.env"): # Check one level up for monorepo structure
+        from dotenv import load_dotenv
         logger.info("Found .env file in parent directory, loading for local development.")
         load_dotenv(dotenv_path="../.env", override=True)
 
@@ -459,6 +524,8 @@ def main_cli():
     # if os.getenv("PLUGIN_LOG_LEVEL", "INFO").upper() == "DEBUG":
     #    os.environ["PYTHONASYNCIODEBUG"] = "1" # This can make asyncio very verbose
 
+    _install_uvloop()
+
     try:
         return asyncio.run(async_main())
     except KeyboardInterrupt:
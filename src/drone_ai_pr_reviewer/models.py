@@ -1,62 +1,215 @@
 # src/drone_ai_pr_reviewer/models.py
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterator, Mapping
 from dataclasses import dataclass, field
-from typing import List, Optional, Any, Dict, Tuple
+from functools import cached_property
+from typing import NamedTuple
+from .utils.constants import DATACLASS_SLOTS, LLM_CONTEXT_LINES
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class ReviewComment:
     """
     Represents a single review comment to be posted to the SCM.
     """
     file_path: str
-    line_number: int # Line number in the file (relative to the diff hunk or absolute in new file)
+    line_number: int # Line number in the file, relative to its diff hunk
     body: str
+    position: int | None = None # Line of the file's diff the comment is on, counted from below its first hunk header
+
+class Change(NamedTuple):
+    """
+    A single line of a diff hunk.
+    """
+    ln: int | None # Hunk-relative line number in the new file (None for removed lines)
+    ln2: int | None # Hunk-relative line number for removed and context lines
+    content: str # Line content without the leading '+', '-' or ' '
+    type: str # "add", "remove" or "context"
+
+class HunkLineMapping(Mapping):
+    """
+    Read-only map of target line numbers to (hunk_line_number, diff_line_number).
+
+    Stored as three parallel int arrays sorted by target line rather than a dict
+    of tuples, which keeps large hunks compact; lookups use binary search.
+    """
+    __slots__ = ("target_lines", "hunk_lines", "diff_lines")
+
+    def __init__(self):
+        self.target_lines = array("i")
+        self.hunk_lines = array("i")
+        self.diff_lines = array("i")
+
+    def append(self, target_line: int, hunk_line: int, diff_line: int) -> None:
+        """Adds an entry; target lines must be appended in increasing order."""
+        self.target_lines.append(target_line)
+        self.hunk_lines.append(hunk_line)
+        self.diff_lines.append(diff_line)
+
+    def lookup(self, target_line: int) -> tuple[int, int] | None:
+        """Returns (hunk_line_number, diff_line_number) for a target line, or None if it is not in the hunk."""
+        i = bisect_left(self.target_lines, target_line)
+        if i < len(self.target_lines) and self.target_lines[i] == target_line:
+            return self.hunk_lines[i], self.diff_lines[i]
+        return None
+
+    def __getitem__(self, target_line: int) -> tuple[int, int]:
+        found = self.lookup(target_line)
+        if found is None:
+            raise KeyError(target_line)
+        return found
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.target_lines)
+
+    def __len__(self) -> int:
+        return len(self.target_lines)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self.items())!r})"
 
 @dataclass
 class DiffChunk:
     """
     Represents a chunk of changes within a diff file.
+
+    The parser only stores the raw hunk lines; `changes`, `content`, `content_for_llm`
+    and the line mapping are derived from them on first access, so hunks that are never
+    reviewed never pay for it. (Those cached properties live in the instance __dict__,
+    which is why this dataclass is not slotted.)
     """
-    content: str # The formatted diff content for this chunk to send to LLM
-    changes: List[Dict[str, Any]] # List of line changes with line numbers and content
     header: str # The hunk header line (e.g., @@ -1,7 +1,7 @@)
-    hunk_line_mapping: Dict[int, Tuple[int, int]] = field(default_factory=dict) # Maps target line numbers to (hunk_line_number, diff_line_number)
+    lines: list[str] = field(default_factory=list) # Raw hunk lines, each starting with '+', '-' or ' '
+    source_start: int = 0 # First line of the hunk in the old file, from the hunk header
+    target_start: int = 0 # First line of the hunk in the new file, from the hunk header
+
+    @cached_property
+    def changes(self) -> list[Change]:
+        """List of line changes with their hunk-relative line numbers and content."""
+        changes: list[Change] = []
+        hunk_line = 1
+        for line in self.lines:
+            c0 = line[:1]
+            if c0 == "+":
+                changes.append(Change(hunk_line, None, line[1:], "add"))
+                hunk_line += 1
+            elif c0 == "-":
+                changes.append(Change(None, hunk_line, line[1:], "remove"))
+            else:
+                changes.append(Change(hunk_line, hunk_line, line[1:], "context"))
+                hunk_line += 1
+        return changes
+
+    @cached_property
+    def content(self) -> str:
+        """The raw diff text of this hunk, header included."""
+        return "\n".join([self.header, *self.lines]) + "\n"
+
+    @cached_property
+    def hunk_line_mapping(self) -> HunkLineMapping:
+        """Maps target line numbers to (hunk_line_number, diff_line_number)."""
+        mapping = HunkLineMapping()
+        for diff_line, change in enumerate(self.changes, 1):
+            if change.type != "remove":
+                mapping.append(change.ln, change.ln, diff_line)
+        return mapping
 
     @property
+    def has_reviewable_changes(self) -> bool:
+        """True if the hunk adds at least one line that is not blank; otherwise there is nothing to review."""
+        return any(line[:1] == "+" and line[1:].strip() for line in self.lines)
+
+    @cached_property
     def content_for_llm(self) -> str:
-        """Format the chunk content for LLM review."""
+        """The chunk content formatted for LLM review, with hunk-relative line numbers; built once."""
+        return self.format_for_llm()
+
+    @property
+    def llm_line_count(self) -> int:
+        """Highest line number content_for_llm labels a line with."""
+        return max((change.ln or change.ln2 or 0 for change in self.changes), default=0)
+
+    def format_for_llm(self, line_offset: int = 0) -> str:
+        """
+        Format the chunk content for LLM review.
+
+        To keep the prompt small, only LLM_CONTEXT_LINES context lines are kept on either
+        side of each change, trailing whitespace is dropped and tabs are expanded. Line
+        numbers are unchanged, so review line numbers still map back onto the hunk.
+
+        Args:
+            line_offset: Added to every line number, so several hunks of a file can be
+                sent in one request without their line numbers colliding.
+        """
         lines = []
         if self.header:
             lines.append(self.header)
-        
-        for change in self.changes:
-            line_num = change.get('ln') or change.get('ln2') or ''
-            content = change.get('content', '')
-            lines.append(f"{line_num} {content}")
-        
+
+        changes = self.changes
+        # Distance of each line to the nearest added/removed line, from both directions
+        distance = [len(changes) + 1] * len(changes)
+        last_change = None
+        for i, change in enumerate(changes):
+            if change.type != "context":
+                last_change = i
+            if last_change is not None:
+                distance[i] = i - last_change
+        last_change = None
+        for i in range(len(changes) - 1, -1, -1):
+            if changes[i].type != "context":
+                last_change = i
+            if last_change is not None:
+                distance[i] = min(distance[i], last_change - i)
+
+        for change, dist in zip(changes, distance):
+            if dist > LLM_CONTEXT_LINES:
+                continue
+            line_num = change.ln or change.ln2
+            line_num = line_num + line_offset if line_num else ''
+            lines.append(f"{line_num} {change.content.expandtabs(4).rstrip()}")
+
         return '\n'.join(lines)
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class DiffFile:
     """
     Represents a single file in a diff.
     """
-    old_path: Optional[str] # Path before changes (None for new files)
-    new_path: Optional[str] # Path after changes (None for deleted files, though we filter those)
+    old_path: str | None # Path before changes (None for new files)
+    new_path: str | None # Path after changes (None for deleted files, though we filter those)
     is_new_file: bool = False
     is_deleted_file: bool = False
     is_renamed_file: bool = False
-    chunks: List[DiffChunk] = field(default_factory=list)
-    hunk_line_mappings: List[Dict[int, Tuple[int, int]]] = field(default_factory=list)  # Maps target line numbers to (hunk_line_number, diff_line_number)
-    diff_file_native_obj: Optional[Any] = None # Store the original object from the diff parsing library for richer access if needed
+    chunks: list[DiffChunk] = field(default_factory=list)
+    display_path: str | None = field(init=False) # Path to display or use for SCM comments (usually new_path)
+
+    def __post_init__(self):
+        # Paths are fixed once parsed, so the display path is resolved once rather than on every access
+        self.display_path = self.new_path if self.new_path != "/dev/null" else self.old_path
 
     @property
-    def display_path(self) -> Optional[str]:
-        """Returns the path to display or use for SCM comments (usually new_path)."""
-        return self.new_path if self.new_path != "/dev/null" else self.old_path
+    def hunk_line_mappings(self) -> list[HunkLineMapping]:
+        """Per-chunk maps of target line numbers to (hunk_line_number, diff_line_number)."""
+        return [chunk.hunk_line_mapping for chunk in self.chunks]
+
+    def diff_position(self, chunk_index: int, hunk_line: int) -> int | None:
+        """
+        The position of a hunk line in this file's diff, or None if the hunk has no such line.
+
+        Positions count down from the line below the first hunk header, through the
+        following hunk headers, as SCM review APIs expect.
+        """
+        found = self.chunks[chunk_index].hunk_line_mapping.lookup(hunk_line)
+        if found is None:
+            return None
+        # Every earlier hunk takes its lines plus the header of the hunk after it
+        return sum(len(chunk.lines) + 1 for chunk in self.chunks[:chunk_index]) + found[1]
 
 
 # Placeholder for PR details fetched from SCM API, if not fully covered by CI env vars
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class SCMPRDetails:
     pr_id: int # Or str depending on SCM
     title: str
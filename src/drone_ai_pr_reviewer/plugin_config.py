@@ -1,80 +1,110 @@
 # src/drone_ai_pr_reviewer/plugin_config.py
+import json
 import os
 from dataclasses import dataclass, field
-from typing import Optional, Dict, Any, List
+from typing import Callable, Optional, Dict, Any, List, Mapping, TypeVar
 from .models import DiffFile
-from .utils.constants import DEFAULT_TEMPERATURE, DEFAULT_MAX_TOKENS, DEFAULT_TOP_P, DEFAULT_EXCLUDE_PATTERNS, DEFAULT_LOG_LEVEL
+from .utils.file_filter import compile_path_filter
+from .utils.constants import DATACLASS_SLOTS, DEFAULT_TEMPERATURE, DEFAULT_MAX_TOKENS, DEFAULT_TOP_P, DEFAULT_LLM_CONCURRENCY, DEFAULT_LLM_QPS, DEFAULT_EXCLUDE_PATTERNS, DEFAULT_LOG_LEVEL
 
-@dataclass
+_Number = TypeVar("_Number", int, float)
+
+_VALID_LOG_LEVELS = frozenset({"DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"})
+
+def _infer_llm_provider(model_name: str) -> str:
+    """
+    Infers the LiteLLM provider family from a model name.
+
+    Returns:
+        "azure", "ollama" or "openai" (the default, also used for OpenAI-compatible APIs).
+    """
+    model_name = model_name.lower()
+    if "azure" in model_name:
+        return "azure"
+    if "ollama" in model_name:
+        return "ollama"
+    return "openai"
+
+def _json_list_from_env(env: Mapping[str, str], name: str) -> List[Dict[str, Any]]:
+    """Parses an environment variable holding a JSON list, warning and returning [] if it is malformed."""
+    raw = env.get(name)
+    if not raw:
+        return []
+    try:
+        value = json.loads(raw)
+    except ValueError as e:
+        print(f"WARN: [PluginConfig] {name} is not valid JSON ({e}); ignoring it.")
+        return []
+    if not isinstance(value, list):
+        print(f"WARN: [PluginConfig] {name} must be a JSON list; ignoring it.")
+        return []
+    return value
+
+def _csv_list_from_env(env: Mapping[str, str], name: str, default: str = "") -> List[str]:
+    """Splits a comma-separated environment variable into its non-empty, stripped items."""
+    return [item.strip() for item in env.get(name, default).split(',') if item.strip()]
+
+def _number_from_env(env: Mapping[str, str], name: str, default: _Number, cast: Callable[[str], _Number]) -> _Number:
+    """Converts a numeric environment variable; the default is used as is when it is unset, and with a warning when it is malformed."""
+    raw = env.get(name)
+    if raw is None:
+        return default
+    try:
+        return cast(raw)
+    except ValueError:
+        print(f"WARN: [PluginConfig] {name} '{raw}' is not a valid {cast.__name__}. Defaulting to '{default}'.")
+        return default
+
+@dataclass(**DATACLASS_SLOTS)
 class PluginConfig:
     """
     Holds all configuration for the AI PR Reviewer plugin,
     primarily sourced from PLUGIN_ prefixed environment variables.
+
+    Use PluginConfig.from_env() (or load_plugin_config()) to read them; the field
+    defaults here are what an unset variable means. The class is slotted, so every
+    attribute set on it (including the CI fields main.py fills in) must be declared below.
     """
 
     # --- Core LLM Settings ---
-    llm_model: Optional[str] = field(
-        default_factory=lambda: os.getenv("PLUGIN_LLM_MODEL")
-    )
-    llm_api_key: Optional[str] = field(
-        default_factory=lambda: os.getenv("PLUGIN_LLM_API_KEY")
-    ) # Handled as a secret by CI
-    llm_api_base: Optional[str] = field(
-        default_factory=lambda: os.getenv("PLUGIN_LLM_API_BASE")
-    )
+    llm_model: Optional[str] = None # PLUGIN_LLM_MODEL
+    llm_api_key: Optional[str] = None # PLUGIN_LLM_API_KEY; handled as a secret by CI
+    llm_api_base: Optional[str] = None # PLUGIN_LLM_API_BASE
+    llm_deployments: List[Dict[str, Any]] = field(default_factory=list) # PLUGIN_LLM_DEPLOYMENTS: LiteLLM Router model_list; when set, llm_model names the deployment group to use
+    llm_fallback_models: List[str] = field(default_factory=list) # PLUGIN_LLM_FALLBACK_MODELS: deployment groups to fall back to when llm_model keeps failing
+    llm_provider: str = field(init=False) # Provider family inferred from llm_model once in __post_init__: "azure", "ollama" or "openai"
 
     # --- Optional LLM Parameters ---
-    temperature: float = field(
-        default_factory=lambda: float(os.getenv("PLUGIN_TEMPERATURE", str(DEFAULT_TEMPERATURE)))
-    )
-    max_tokens: int = field(
-        default_factory=lambda: int(os.getenv("PLUGIN_MAX_TOKENS", str(DEFAULT_MAX_TOKENS)))
-    )
-    top_p: float = field(
-        default_factory=lambda: float(os.getenv("PLUGIN_TOP_P", str(DEFAULT_TOP_P)))
-    )
+    temperature: float = DEFAULT_TEMPERATURE # PLUGIN_TEMPERATURE
+    max_tokens: int = DEFAULT_MAX_TOKENS # PLUGIN_MAX_TOKENS
+    top_p: float = DEFAULT_TOP_P # PLUGIN_TOP_P
+    llm_concurrency: int = DEFAULT_LLM_CONCURRENCY # PLUGIN_LLM_CONCURRENCY: max LLM requests in flight at once
+    llm_qps: float = DEFAULT_LLM_QPS # PLUGIN_LLM_QPS: max LLM requests started per second (0 disables the limit)
     # Consider adding:
-    # frequency_penalty: Optional[float] = field(default_factory=lambda: float(os.getenv("PLUGIN_FREQUENCY_PENALTY", "0.0")) if os.getenv("PLUGIN_FREQUENCY_PENALTY") else None)
-    # presence_penalty: Optional[float] = field(default_factory=lambda: float(os.getenv("PLUGIN_PRESENCE_PENALTY", "0.0")) if os.getenv("PLUGIN_PRESENCE_PENALTY") else None)
+    # frequency_penalty: Optional[float] = None # PLUGIN_FREQUENCY_PENALTY
+    # presence_penalty: Optional[float] = None # PLUGIN_PRESENCE_PENALTY
 
 
     # --- Optional Provider-Specific Configuration ---
-    azure_api_version: Optional[str] = field(
-        default_factory=lambda: os.getenv("PLUGIN_AZURE_API_VERSION")
-    )
-    vertex_project: Optional[str] = field(
-        default_factory=lambda: os.getenv("PLUGIN_VERTEXAI_PROJECT")
-    )
-    vertex_location: Optional[str] = field(
-        default_factory=lambda: os.getenv("PLUGIN_VERTEXAI_LOCATION")
-    )
-    aws_region_name: Optional[str] = field(
-        default_factory=lambda: os.getenv("PLUGIN_AWS_REGION_NAME")
-    )
+    azure_api_version: Optional[str] = None # PLUGIN_AZURE_API_VERSION
+    vertex_project: Optional[str] = None # PLUGIN_VERTEXAI_PROJECT
+    vertex_location: Optional[str] = None # PLUGIN_VERTEXAI_LOCATION
+    aws_region_name: Optional[str] = None # PLUGIN_AWS_REGION_NAME
 
     # --- SCM Settings ---
-    scm_token: Optional[str] = field(
-        default_factory=lambda: os.getenv("PLUGIN_SCM_TOKEN")
-    ) # Handled as a secret by CI
-    # Future:
-    # scm_provider: str = field(default_factory=lambda: os.getenv("PLUGIN_SCM_PROVIDER", "github").lower()) # e.g. github, gitlab, bitbucket_server, azure_devops
-    # scm_api_url: Optional[str] = field(default_factory=lambda: os.getenv("PLUGIN_SCM_API_URL")) # For self-hosted SCMs
+    scm_token: Optional[str] = None # PLUGIN_SCM_TOKEN; handled as a secret by CI
+    # Not read from the environment yet; declared so SCMClient can rely on them being present
+    scm_provider: str = "github" # Future PLUGIN_SCM_PROVIDER, e.g. github, gitlab, bitbucket_server, azure_devops
+    scm_api_url: Optional[str] = None # Future PLUGIN_SCM_API_URL, for self-hosted SCMs
 
 
     # --- Plugin Behavior ---
-    exclude_patterns: List[str] = field(
-        default_factory=lambda: [
-            p.strip() for p in os.getenv("PLUGIN_EXCLUDE_PATTERNS", DEFAULT_EXCLUDE_PATTERNS).split(',') if p.strip()
-        ]
-    )
-    include_patterns: List[str] = field(
-        default_factory=lambda: [
-            p.strip() for p in os.getenv("PLUGIN_INCLUDE_PATTERNS", "").split(',') if p.strip()
-        ]
-    )
-    log_level: str = field(
-        default_factory=lambda: os.getenv("PLUGIN_LOG_LEVEL", DEFAULT_LOG_LEVEL).upper()
-    )
+    exclude_patterns: List[str] = field(default_factory=list) # PLUGIN_EXCLUDE_PATTERNS
+    include_patterns: List[str] = field(default_factory=list) # PLUGIN_INCLUDE_PATTERNS
+    log_level: str = DEFAULT_LOG_LEVEL # PLUGIN_LOG_LEVEL
+    cache_dir: Optional[str] = None # PLUGIN_CACHE_DIR: directory persisted between CI runs to reuse LLM reviews; disabled when unset
+    checkpoint_path: Optional[str] = None # PLUGIN_CHECKPOINT_PATH: JSONL file recording each completed review, so an interrupted run resumes; disabled when unset
+    path_filter: Callable[[str], bool] = field(init=False, repr=False, compare=False) # include/exclude patterns compiled once in __post_init__
 
     # --- CI Environment Information (to be populated by main.py from CI system variables) ---
     ci_system: Optional[str] = None
@@ -107,6 +137,39 @@ class PluginConfig:
 
     diff_files: List[DiffFile] = field(default_factory=list)
 
+    @classmethod
+    def from_env(cls, env: Optional[Mapping[str, str]] = None) -> "PluginConfig":
+        """
+        Builds the configuration from PLUGIN_ environment variables.
+
+        Args:
+            env: Variables to read; defaults to a single snapshot of os.environ,
+                so each setting is one plain dict lookup.
+        """
+        env = dict(os.environ) if env is None else env
+        return cls(
+            llm_model=env.get("PLUGIN_LLM_MODEL"),
+            llm_api_key=env.get("PLUGIN_LLM_API_KEY"),
+            llm_api_base=env.get("PLUGIN_LLM_API_BASE"),
+            llm_deployments=_json_list_from_env(env, "PLUGIN_LLM_DEPLOYMENTS"),
+            llm_fallback_models=_csv_list_from_env(env, "PLUGIN_LLM_FALLBACK_MODELS"),
+            temperature=_number_from_env(env, "PLUGIN_TEMPERATURE", DEFAULT_TEMPERATURE, float),
+            max_tokens=_number_from_env(env, "PLUGIN_MAX_TOKENS", DEFAULT_MAX_TOKENS, int),
+            top_p=_number_from_env(env, "PLUGIN_TOP_P", DEFAULT_TOP_P, float),
+            llm_concurrency=_number_from_env(env, "PLUGIN_LLM_CONCURRENCY", DEFAULT_LLM_CONCURRENCY, int),
+            llm_qps=_number_from_env(env, "PLUGIN_LLM_QPS", DEFAULT_LLM_QPS, float),
+            azure_api_version=env.get("PLUGIN_AZURE_API_VERSION"),
+            vertex_project=env.get("PLUGIN_VERTEXAI_PROJECT"),
+            vertex_location=env.get("PLUGIN_VERTEXAI_LOCATION"),
+            aws_region_name=env.get("PLUGIN_AWS_REGION_NAME"),
+            scm_token=env.get("PLUGIN_SCM_TOKEN"),
+            exclude_patterns=_csv_list_from_env(env, "PLUGIN_EXCLUDE_PATTERNS", DEFAULT_EXCLUDE_PATTERNS),
+            include_patterns=_csv_list_from_env(env, "PLUGIN_INCLUDE_PATTERNS"),
+            log_level=env.get("PLUGIN_LOG_LEVEL", DEFAULT_LOG_LEVEL).upper(),
+            cache_dir=env.get("PLUGIN_CACHE_DIR") or None,
+            checkpoint_path=env.get("PLUGIN_CHECKPOINT_PATH") or None,
+        )
+
     def __post_init__(self):
         if not self.llm_model:
             print("WARN: [PluginConfig] PLUGIN_LLM_MODEL is not set.")
@@ -114,11 +177,16 @@ class PluginConfig:
         if not self.scm_token:
             print("WARN: [PluginConfig] PLUGIN_SCM_TOKEN is not set.")
 
-        valid_log_levels = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
-        if self.log_level not in valid_log_levels:
+        if self.log_level not in _VALID_LOG_LEVELS:
             print(f"WARN: [PluginConfig] Invalid PLUGIN_LOG_LEVEL '{self.log_level}'. Defaulting to '{DEFAULT_LOG_LEVEL}'.")
             self.log_level = DEFAULT_LOG_LEVEL
 
+        # The model is fixed for the run, so its provider is derived once instead of at each use
+        self.llm_provider = _infer_llm_provider(self.llm_model or "")
+
+        # The patterns are fixed for the run, so they are compiled once here rather than per parse
+        self.path_filter = compile_path_filter(self.include_patterns, self.exclude_patterns)
+
 def load_plugin_config() -> PluginConfig:
     """
     Factory function to create and return a PluginConfig instance.
@@ -129,7 +197,7 @@ def load_plugin_config() -> PluginConfig:
     #                     format='%(asctime)s - %(levelname)s - %(message)s')
     # logger = logging.getLogger(__name__) # or a global logger
     # logger.info("Plugin configuration loaded.")
-    return PluginConfig()# src/drone_ai_pr_reviewer/llm_auth_helper.py
+    return PluginConfig.from_env()# src/drone_ai_pr_reviewer/llm_auth_helper.py
 import os
 import logging # Using standard logging
 from typing import TYPE_CHECKING
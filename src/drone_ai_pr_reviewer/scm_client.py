@@ -2,11 +2,16 @@
 import logging
 import requests # Using requests library for HTTP calls
 import json
-from typing import List, Dict, Any, Optional, TYPE_CHECKING
+import urllib3
+from typing import List, Dict, Any, Iterator, Optional, TYPE_CHECKING
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .diff_parser import iter_lines_chunked
+from .models import ReviewComment, SCMPRDetails
+from .utils.constants import SCM_HTTP_POOL_SIZE, SCM_HTTP_RETRIES
 
 if TYPE_CHECKING:
     from .plugin_config import PluginConfig
-    from .models import ReviewComment, SCMPRDetails
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +19,12 @@ logger = logging.getLogger(__name__)
 # These would be adjusted based on the target SCM
 # For a multi-SCM client, these would be dynamically set or part of SCM-specific classes.
 # GITHUB_API_BASE_URL = "https://api.github.com"
+DIFF_MEDIA_TYPE = "application/vnd.github.v3.diff" # SCM-specific media type for diff
+# Built once and shared by every diff request; requests merges it into a new dict per call, never modifying it
+DIFF_HEADERS = {"Accept": DIFF_MEDIA_TYPE}
+# Errors a streamed diff can raise while its lines are read, after the request succeeded;
+# the body is read from urllib3 directly, so its errors are not wrapped by requests
+DIFF_STREAM_ERRORS = (requests.exceptions.RequestException, urllib3.exceptions.HTTPError)
 
 class BaseSCMClient:
     """
@@ -35,45 +46,91 @@ class BaseSCMClient:
         # self.api_base_url = config.scm_api_url or GITHUB_API_BASE_URL # Example
         
         # A more generic way, assuming GitHub for now if not specified
-        self.api_base_url = getattr(config, 'scm_api_url', None) or "https://api.github.com"
-        if "gitlab" in getattr(config, 'scm_provider', "github").lower(): # Example
-            self.api_base_url = getattr(config, 'scm_api_url', None) or "https://gitlab.com/api/v4"
+        self.api_base_url = config.scm_api_url or "https://api.github.com"
+        if "gitlab" in config.scm_provider.lower(): # Example
+            self.api_base_url = config.scm_api_url or "https://gitlab.com/api/v4"
             self.headers["Accept"] = "application/json" # GitLab uses this
             self.headers["Authorization"] = f"Bearer {self.config.scm_token}"
             if "X-GitHub-Api-Version" in self.headers:
                 del self.headers["X-GitHub-Api-Version"]
         # Add elif for bitbucket, azure_devops etc.
 
-        logger.info(f"SCM Client initialized for base URL: {self.api_base_url}")
+        # One session for all calls, so connections (and their TLS handshakes) are reused.
+        # Retry only covers idempotent methods, so a review is never posted twice.
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=SCM_HTTP_POOL_SIZE,
+            max_retries=Retry(total=SCM_HTTP_RETRIES, backoff_factor=0.3, status_forcelist=(429, 502, 503, 504))
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        logger.info("SCM Client initialized for base URL: %s", self.api_base_url)
+
+    def close(self) -> None:
+        """Closes the pooled connections of the HTTP session."""
+        self.session.close()
+
+    def __enter__(self) -> 'BaseSCMClient':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
 
 
     def _request(self, method: str, endpoint: str, params: Optional[Dict] = None, json_data: Optional[Dict] = None, 
                  expected_status: int = 200, custom_headers: Optional[Dict] = None) -> Optional[Any]:
         """Helper method to make HTTP requests."""
         url = f"{self.api_base_url}{endpoint}"
-        request_headers = self.headers.copy()
-        if custom_headers:
-            request_headers.update(custom_headers)
         
         try:
-            logger.debug(f"Making SCM API {method} request to {url} with params {params} and data {json_data}")
-            response = requests.request(method, url, headers=request_headers, params=params, json=json_data, timeout=30)
+            logger.debug("Making SCM API %s request to %s with params %s and data %s", method, url, params, json_data)
+            # The session merges its default headers with custom_headers
+            response = self.session.request(method, url, headers=custom_headers, params=params, json=json_data, timeout=30)
             
             if response.status_code == expected_status:
                 if response.content: # Check if there is content to parse
-                    # For 'diff' media type, content is text, not JSON
-                    if custom_headers and custom_headers.get("Accept") == "application/vnd.github.v3.diff":
-                        return response.text
+                    # Diffs are streamed by _stream_diff; everything requested here is JSON
                     return response.json()
                 return True # For successful calls with no content (e.g., 204 No Content)
             else:
-                logger.error(f"SCM API request to {url} failed with status {response.status_code}: {response.text[:500]}")
+                logger.error("SCM API request to %s failed with status %s: %s", url, response.status_code, response.text[:500])
                 return None
         except requests.exceptions.RequestException as e:
-            logger.error(f"SCM API request to {url} encountered an exception: {e}", exc_info=True)
+            logger.error("SCM API request to %s encountered an exception: %s", url, e, exc_info=True)
+            return None
+
+    def _stream_diff(self, endpoint: str) -> Optional[Iterator[bytes]]:
+        """
+        Requests a diff and returns an iterator over its raw lines, read as the body arrives.
+
+        The body is never held in memory as a whole; the lines can be passed straight to
+        parse_diff_text. Returns None if the request fails; failures while the body is
+        read are raised from the iterator as one of DIFF_STREAM_ERRORS.
+        """
+        url = f"{self.api_base_url}{endpoint}"
+        try:
+            logger.debug("Streaming SCM API diff from %s", url)
+            response = self.session.get(url, headers=DIFF_HEADERS, stream=True, timeout=30)
+        except requests.exceptions.RequestException as e:
+            logger.error("SCM API request to %s encountered an exception: %s", url, e, exc_info=True)
             return None
+        if response.status_code != 200:
+            logger.error("SCM API request to %s failed with status %s: %s", url, response.status_code, response.text[:500])
+            response.close()
+            return None
+        # Reading response.raw directly skips requests' own decoding, so gzip is undone here
+        response.raw.decode_content = True
+        return self._iter_response_lines(response)
+
+    @staticmethod
+    def _iter_response_lines(response: requests.Response) -> Iterator[bytes]:
+        with response:
+            yield from iter_lines_chunked(response.raw)
 
-    def get_pr_details(self) -> Optional['SCMPRDetails']:
+    def get_pr_details(self) -> Optional[SCMPRDetails]:
         """
         Fetches PR details like description, actual title (if not from CI env).
         This is needed because CI env vars might not have the full description.
@@ -84,7 +141,7 @@ class BaseSCMClient:
         
         # Example for GitHub:
         endpoint = f"/repos/{self.config.ci_repo_owner}/{self.config.ci_repo_name}/pulls/{self.config.ci_pr_number}"
-        logger.info(f"Fetching PR details from SCM: {endpoint}")
+        logger.info("Fetching PR details from SCM: %s", endpoint)
         
         response_data = self._request("GET", endpoint)
         if response_data and isinstance(response_data, dict):
@@ -97,68 +154,58 @@ class BaseSCMClient:
             # Update config with fetched details if they were missing or to ensure canonical source
             self.config.ci_pr_title = title
             self.config.ci_pr_description = description
-            logger.info(f"Successfully fetched PR details for PR #{self.config.ci_pr_number}.")
+            logger.info("Successfully fetched PR details for PR #%s.", self.config.ci_pr_number)
             
             # Return a more detailed object if needed, or just update config
-            from .models import SCMPRDetails # Local import to avoid circular dependency at module level
             return SCMPRDetails(
                 pr_id=self.config.ci_pr_number,
                 title=title,
                 description=description
                 # Populate other fields if needed
             )
-        logger.error(f"Failed to fetch or parse PR details for PR #{self.config.ci_pr_number}.")
+        logger.error("Failed to fetch or parse PR details for PR #%s.", self.config.ci_pr_number)
         return None
 
 
-    def get_pr_diff(self) -> Optional[str]:
-        """
-        Fetches the diff for the current pull request.
-        The diffing strategy (full PR diff vs. compare commits) is determined
-        by the calling logic in main.py based on the CI event.
-        This method assumes it's getting the diff for the *entire* PR.
-        """
+    def _pr_diff_endpoint(self) -> Optional[str]:
+        """The endpoint of the whole PR's diff, or None if the PR is not known."""
         if not (self.config.ci_repo_owner and self.config.ci_repo_name and self.config.ci_pr_number):
             logger.error("Cannot fetch PR diff: Missing repo owner, name, or PR number.")
             return None
+        # Example for GitHub:
+        return f"/repos/{self.config.ci_repo_owner}/{self.config.ci_repo_name}/pulls/{self.config.ci_pr_number}"
 
+    def _compare_diff_endpoint(self) -> Optional[str]:
+        """The endpoint of the diff between the base and head SHAs, or None if they are not known."""
+        if not (self.config.ci_repo_owner and self.config.ci_repo_name and self.config.ci_base_sha and self.config.ci_head_sha):
+            logger.error("Cannot compare commits: Missing repo owner/name or base/head SHAs.")
+            return None
         # Example for GitHub:
-        endpoint = f"/repos/{self.config.ci_repo_owner}/{self.config.ci_repo_name}/pulls/{self.config.ci_pr_number}"
-        custom_headers = {"Accept": "application/vnd.github.v3.diff"} # SCM-specific media type for diff
-        
-        logger.info(f"Fetching full PR diff from SCM: {endpoint}")
-        diff_text = self._request("GET", endpoint, custom_headers=custom_headers)
-        
-        if diff_text and isinstance(diff_text, str):
-            logger.info(f"Successfully fetched PR diff (length: {len(diff_text)}).")
-            return diff_text
-        
-        logger.error(f"Failed to fetch PR diff for PR #{self.config.ci_pr_number}.")
-        return None
+        return f"/repos/{self.config.ci_repo_owner}/{self.config.ci_repo_name}/compare/{self.config.ci_base_sha}...{self.config.ci_head_sha}"
 
-    def compare_commits_diff(self) -> Optional[str]:
+    def stream_pr_diff(self) -> Optional[Iterator[bytes]]:
         """
-        Fetches the diff between two commits (base_sha and head_sha from config).
-        Used for "synchronize" events.
+        Fetches the diff of the whole pull request, as raw lines read while they download.
+        The diffing strategy (full PR diff vs. compare commits) is determined
+        by the calling logic in main.py based on the CI event.
         """
-        if not (self.config.ci_repo_owner and self.config.ci_repo_name and self.config.ci_base_sha and self.config.ci_head_sha):
-            logger.error("Cannot compare commits: Missing repo owner/name or base/head SHAs.")
+        endpoint = self._pr_diff_endpoint()
+        if not endpoint:
             return None
+        logger.info("Streaming full PR diff from SCM: %s", endpoint)
+        return self._stream_diff(endpoint)
 
-        # Example for GitHub:
-        endpoint = f"/repos/{self.config.ci_repo_owner}/{self.config.ci_repo_name}/compare/{self.config.ci_base_sha}...{self.config.ci_head_sha}"
-        custom_headers = {"Accept": "application/vnd.github.v3.diff"}
-        
-        logger.info(f"Fetching commit comparison diff from SCM: {endpoint} ({self.config.ci_base_sha}..{self.config.ci_head_sha})")
-        diff_text = self._request("GET", endpoint, custom_headers=custom_headers)
+    def stream_commits_diff(self) -> Optional[Iterator[bytes]]:
+        """
+        Fetches the diff between two commits (base_sha and head_sha from config), as raw
+        lines read while they download. Used for "synchronize" events.
+        """
+        endpoint = self._compare_diff_endpoint()
+        if not endpoint:
+            return None
+        logger.info("Streaming commit comparison diff from SCM: %s (%s..%s)", endpoint, self.config.ci_base_sha, self.config.ci_head_sha)
+        return self._stream_diff(endpoint)
 
-        if diff_text and isinstance(diff_text, str):
-            logger.info(f"Successfully fetched commit comparison diff (length: {len(diff_text)}).")
-            return diff_text
-        
-        logger.error(f"Failed to fetch commit comparison diff.")
-        return None
-        
     def get_target_branch_head_sha(self) -> Optional[str]:
         """
         Fetches the HEAD SHA of the PR's target branch.
@@ -170,19 +217,19 @@ class BaseSCMClient:
 
         # Example for GitHub: refs/heads/branch-name
         endpoint = f"/repos/{self.config.ci_repo_owner}/{self.config.ci_repo_name}/git/ref/heads/{self.config.ci_target_branch}"
-        logger.info(f"Fetching target branch head SHA for '{self.config.ci_target_branch}' from: {endpoint}")
+        logger.info("Fetching target branch head SHA for '%s' from: %s", self.config.ci_target_branch, endpoint)
         
         response_data = self._request("GET", endpoint)
         if response_data and isinstance(response_data, dict) and "object" in response_data and "sha" in response_data["object"]:
             sha = response_data["object"]["sha"]
-            logger.info(f"Successfully fetched target branch '{self.config.ci_target_branch}' head SHA: {sha}")
+            logger.info("Successfully fetched target branch '%s' head SHA: %s", self.config.ci_target_branch, sha)
             return sha
         
-        logger.error(f"Failed to fetch target branch head SHA for '{self.config.ci_target_branch}'. Response: {response_data}")
+        logger.error("Failed to fetch target branch head SHA for '%s'. Response: %s", self.config.ci_target_branch, response_data)
         return None
 
 
-    def post_review_comments(self, comments: List['ReviewComment']) -> bool:
+    def post_review_comments(self, comments: List[ReviewComment]) -> bool:
         """
         Posts review comments to the pull request.
         SCM APIs usually have a way to create a "review" with multiple comments.
@@ -191,68 +238,58 @@ class BaseSCMClient:
             logger.info("No comments to post.")
             return True
         
-        if not (self.config.ci_repo_owner and self.config.ci_repo_name and self.config.ci_pr_number and self.config.ci_head_sha):
+        config = self.config
+        if not (config.ci_repo_owner and config.ci_repo_name and config.ci_pr_number and config.ci_head_sha):
             logger.error("Cannot post review comments: Missing repo owner, name, PR number, or head SHA.")
             return False
 
+        if not config.diff_files:
+            logger.error("Cannot post review comments: No parsed diff files to place them in.")
+            return False
+
         # Example for GitHub: Create a Review with comments
         # https://docs.github.com/en/rest/pulls/reviews?apiVersion=2022-11-28#create-a-review-for-a-pull-request
-        endpoint = f"/repos/{self.config.ci_repo_owner}/{self.config.ci_repo_name}/pulls/{self.config.ci_pr_number}/reviews"
+        endpoint = f"/repos/{config.ci_repo_owner}/{config.ci_repo_name}/pulls/{config.ci_pr_number}/reviews"
         
         # GitHub's API expects comments in a specific format within the review payload
-        # Each comment needs: path, body, line (for new code) or side & line (for old code/context)
-        # For comments on added lines, it's often 'line' (line number in the diff relative to hunk)
-        # or 'position' (number of lines from the start of the hunk). This needs careful mapping.
-        # For simplicity, assuming 'line' refers to the line number in the new file that the LLM provided.
-        # GitHub's API might require careful handling of line numbers (diff-relative vs file-absolute).
-        # The `line` parameter for a new review comment is the line number in the *unified diff*.
-        # This is NOT the absolute line number in the file.
-        # We need to map our LLM's `lineNumber` (absolute in new file) to a diff-relative line number.
-        # This is a complex part. For now, let's assume a simplification or placeholder.
-        # TODO: Implement robust mapping from absolute file line number to diff-relative position for SCM API.
-        #       This often involves re-parsing the diff or using detailed info from the diff parser.
-        #       For now, we'll use the absolute line number, which might not always place comments correctly on all SCMs.
+        # Each comment needs: path, body, and either 'line' (line number in the file) or
+        # 'position' (number of lines down from the file's first hunk header in the diff).
+        # Comments carry the position, mapped from the LLM's line labels when the review was parsed.
+
+        # Paths of the diff files, built once so every comment is a single set lookup
+        diff_paths = {diff_file.new_path for diff_file in config.diff_files}
 
         review_comments_payload = []
         for comment in comments:
-            # Find the correct line number mapping for this comment
             file_path = comment.file_path
-            line_number = comment.line_number
-            
-            # Find the diff file containing the line
-            diff_file = next((f for f in self.config.diff_files if f.new_path == file_path), None)
-            if not diff_file:
-                logger.warning(f"Could not find diff file for {file_path}")
+            if file_path not in diff_paths:
+                logger.warning("Could not find diff file for %s", file_path)
                 continue
-
-            # Find the chunk containing the line
-            for chunk in diff_file.chunks:
-                # The line number is relative to the chunk, so we can use it directly
-                if line_number <= len(chunk.changes):
-                    # Convert line number to position in diff
-                    position = line_number
-                    break
-            else:
-                logger.warning(f"Could not find chunk containing line {line_number} in file {file_path}")
+            if comment.position is None:
+                logger.warning("Could not place the comment on line %s of %s in the diff", comment.line_number, file_path)
                 continue
-                
+
             review_comments_payload.append({
                 "path": file_path,
                 "body": comment.body,
-                "position": position,  # GitHub API expects position relative to the diff
+                "position": comment.position,  # GitHub API expects position relative to the diff
             })
 
+        if not review_comments_payload:
+            logger.warning("None of the %s comments could be placed in the diff; not posting an empty review.", len(comments))
+            return True
+
         payload = {
-            "commit_id": self.config.ci_head_sha, # The SHA of the PR head to associate review with
+            "commit_id": config.ci_head_sha, # The SHA of the PR head to associate review with
             "event": "COMMENT",  # Could be APPROVE, REQUEST_CHANGES, etc.
             "body": "AI Code Reviewer suggestions:",
             "comments": review_comments_payload,
-            "head_sha": self.config.ci_head_sha  # Required for draft reviews
+            "head_sha": config.ci_head_sha  # Required for draft reviews
         }
         
-        logger.info(f"Posting {len(comments)} review comments to PR #{self.config.ci_pr_number}.")
+        logger.info("Posting %s review comments to PR #%s.", len(review_comments_payload), config.ci_pr_number)
         if logger.isEnabledFor(logging.DEBUG):
-            logger.debug(f"Review payload: {json.dumps(payload, indent=2)}")
+            logger.debug("Review payload: %s", json.dumps(payload, indent=2))
 
         response_data = self._request("POST", endpoint, json_data=payload, expected_status=200) # GitHub returns 200 on success
         
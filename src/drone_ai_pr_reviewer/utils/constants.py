@@ -1,6 +1,20 @@
+import sys
+
 # Default values for optional parameters
 DEFAULT_TEMPERATURE = 0.2
 DEFAULT_MAX_TOKENS = 700
 DEFAULT_TOP_P = 1.0
+DEFAULT_LLM_CONCURRENCY = 16
+DEFAULT_LLM_QPS = 10.0
+REVIEW_COMMENT_BATCH_SIZE = 20 # Comments posted to the SCM per review while other chunks are still being reviewed
 DEFAULT_EXCLUDE_PATTERNS = ""
 DEFAULT_LOG_LEVEL = "INFO"
+LLM_BATCH_MAX_CHARS = 12000 # Hunks of one file are sent to the LLM together up to this many characters
+LLM_MAX_CHUNK_CHARS = 48000 # Larger hunks (generated or vendored code, mostly) are not sent to the LLM
+LLM_CONTEXT_LINES = 3 # Unchanged lines kept around each change in the diff sent to the LLM
+REVIEW_CACHE_TTL_SECONDS = 30 * 24 * 60 * 60 # Persisted reviews are reused for 30 days
+SCM_HTTP_POOL_SIZE = 10 # Keep-alive connections kept open to the SCM API
+SCM_HTTP_RETRIES = 3 # Retries of idempotent SCM API requests on connection errors and 429/5xx responses
+
+# Keyword arguments for @dataclass: slotted classes (no per-instance __dict__) need Python 3.10+, older versions get regular ones
+DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
@@ -1,6 +1,33 @@
-from typing import List, Optional
+import functools
+import re
+from typing import Callable, List, Optional, Tuple
 from pathspec import PathSpec
 from pathspec.patterns.gitwildmatch import GitWildMatchPattern
+from pathspec.util import normalize_file
+
+# Named groups in pathspec's generated regexes; they would clash once several are joined
+_NAMED_GROUP_RE = re.compile(r"\(\?P<\w+>")
+
+@functools.lru_cache(maxsize=16)
+def _compile_matcher(patterns: Tuple[str, ...]) -> Callable[[str], bool]:
+    """
+    Compile git-style patterns into a single match function.
+
+    Cached per pattern tuple: the same patterns are usually compiled more than once
+    per run (config load, file filtering), and the returned function is stateless.
+
+    Without negated ('!') patterns a path matches if any pattern does, so all of them
+    are joined into one regex and each path is checked in a single search instead of
+    one per pattern. With negations, order matters and PathSpec's own matching is used.
+    """
+    spec = PathSpec.from_lines(GitWildMatchPattern, patterns)
+    active = [pattern for pattern in spec.patterns if pattern.include is not None]
+    if not active or any(not pattern.include for pattern in active):
+        return spec.match_file
+    union = re.compile("|".join(
+        f"(?:{_NAMED_GROUP_RE.sub('(?:', pattern.regex.pattern)})" for pattern in active
+    ))
+    return lambda path: union.match(normalize_file(path)) is not None
 
 def filter_files_by_patterns(
     files: List[str],
@@ -21,27 +48,39 @@ def filter_files_by_patterns(
     if not files:
         return []
     
-    # Create PathSpec objects for include/exclude patterns
-    include_spec = None
-    exclude_spec = None
+    if not include_patterns and not exclude_patterns:
+        return files  # No patterns means include everything
     
-    if include_patterns:
-        include_spec = PathSpec.from_lines(GitWildMatchPattern, include_patterns)
-    
-    if exclude_patterns:
-        exclude_spec = PathSpec.from_lines(GitWildMatchPattern, exclude_patterns)
-    
-    # First pass: Include files that match include patterns
-    if include_spec:
-        included_files = [f for f in files if include_spec.match_file(f)]
-    else:
-        included_files = files  # No include patterns means include everything
-    
-    # Second pass: Exclude files that match exclude patterns
-    if exclude_spec:
-        return [f for f in included_files if not exclude_spec.match_file(f)]
-    
-    return included_files
+    # Single pass: each file is checked against the include patterns, then the exclude patterns
+    keep_path = compile_path_filter(include_patterns, exclude_patterns)
+    return [f for f in files if keep_path(f)]
+
+def compile_path_filter(
+    include_patterns: Optional[List[str]] = None,
+    exclude_patterns: Optional[List[str]] = None
+) -> Callable[[str], bool]:
+    """
+    Compile include and exclude patterns once into a predicate for single paths.
+
+    Use this instead of filter_files_by_patterns when paths arrive one at a time
+    (e.g. while streaming a diff), so the patterns are not recompiled per path.
+
+    Args:
+        include_patterns: Optional list of patterns to include (git-style patterns)
+        exclude_patterns: Optional list of patterns to exclude (git-style patterns)
+
+    Returns:
+        A function returning True if the given path should be kept
+    """
+    include_match = _compile_matcher(tuple(include_patterns)) if include_patterns else None
+    exclude_match = _compile_matcher(tuple(exclude_patterns)) if exclude_patterns else None
+
+    def path_filter(path: str) -> bool:
+        if include_match and not include_match(path):
+            return False
+        return not (exclude_match and exclude_match(path))
+
+    return path_filter
 
 # Example usage:
 if __name__ == "__main__":
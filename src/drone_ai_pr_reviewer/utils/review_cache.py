@@ -0,0 +1,117 @@
+# src/drone_ai_pr_reviewer/utils/review_cache.py
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError: # Not available on Windows; appends are then unlocked
+    fcntl = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+class ReviewDiskCache:
+    """
+    Persistent exact-match cache of LLM reviews, one small JSON file per key.
+
+    Meant to be kept between CI runs (e.g. on a cached volume), so re-triggered
+    builds of the same commit reuse earlier reviews instead of calling the LLM again.
+    Cache errors are logged and treated as misses; they never fail a review.
+    """
+    def __init__(self, directory: str, ttl_seconds: float):
+        """
+        Args:
+            directory: Directory holding the cache entries; created if missing.
+            ttl_seconds: Entries older than this are ignored.
+        """
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Returns the cached reviews for a key, or None if absent or expired."""
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable review cache entry {path}: {e}")
+            return None
+
+    def set(self, key: str, reviews: List[Dict[str, Any]]) -> None:
+        """Stores the reviews for a key, replacing the entry atomically."""
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(reviews, f)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"Could not write review cache entry for {key}: {e}")
+
+class ReviewCheckpoint:
+    """
+    Append-only JSONL log of completed chunk reviews, one {"k": key, "v": reviews} object per line.
+
+    Each review is appended as soon as it is received, so a run that dies part-way
+    through can be restarted and only sends the chunks it had not reviewed yet.
+    Appends take an exclusive lock, so several processes can share one file.
+    """
+    def __init__(self, path: str):
+        """
+        Args:
+            path: The checkpoint file; created if missing, appended to otherwise.
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+        # A run killed mid-write leaves a partial last line; start new entries on a line of their own
+        if self._file.tell() > 0:
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._file.write("\n")
+
+    def load(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Reads every review recorded so far, keyed by cache key; a torn last line is skipped."""
+        entries: Dict[str, List[Dict[str, Any]]] = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        entries[entry["k"]] = entry["v"]
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except OSError as e:
+            logger.warning(f"Could not read review checkpoint {self.path}: {e}")
+        return entries
+
+    def append(self, key: str, reviews: List[Dict[str, Any]]) -> None:
+        """Records the reviews for a key."""
+        line = json.dumps({"k": key, "v": reviews}, separators=(",", ":")) + "\n"
+        try:
+            if fcntl:
+                fcntl.flock(self._file, fcntl.LOCK_EX)
+            try:
+                self._file.write(line)
+                self._file.flush()
+            finally:
+                if fcntl:
+                    fcntl.flock(self._file, fcntl.LOCK_UN)
+        except OSError as e:
+            logger.warning(f"Could not append to review checkpoint {self.path}: {e}")
+
+    def close(self) -> None:
+        self._file.close()
@@ -1,20 +1,114 @@
+import io
 import unittest
 import tempfile
 import os
+import shutil
 import subprocess
-from src.drone_ai_pr_reviewer.diff_parser import parse_diff_text, get_git_diff
-from src.drone_ai_pr_reviewer.models import DiffFile, DiffChunk
+from src.drone_ai_pr_reviewer.diff_parser import parse_diff_text, get_git_diff, get_parsed_diff, iter_lines_chunked
+from src.drone_ai_pr_reviewer.models import Change, DiffFile, DiffChunk
+
+# Repository-relative paths used by the fixtures and the assertions on them
+SRC_FILE1 = "src/file1.py"
+SRC_FILE2 = "src/file2.py"
+TESTS_FILE = "tests/test_file.py"
+
+# Fixture repositories go on tmpfs where available, so commits never wait on disk I/O
+FIXTURE_TMP_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+# Output of get_git_diff for a commit adding a line at the top and at the bottom of
+# two identical files, captured once so the parser can be tested without running git
+GIT_DIFF_SIMPLE = """\
+diff --git a/src/file1.py b/src/file1.py
+index 161a197..fad800f 100644
+--- a/src/file1.py
++++ b/src/file1.py
+@@ -2,0 +3 @@ def main():
++    print("Hello")
+@@ -6,0 +8 @@ if __name__ == '__main__':
++    print("Goodbye")
+diff --git a/src/file2.py b/src/file2.py
+index 161a197..fad800f 100644
+--- a/src/file2.py
++++ b/src/file2.py
+@@ -2,0 +3 @@ def main():
++    print("Hello")
+@@ -6,0 +8 @@ if __name__ == '__main__':
++    print("Goodbye")
+"""
+
+
+# Fixture file contents for the git-backed tests
+MAIN_PY = b"""\
+def main():
+    pass
+
+if __name__ == '__main__':
+    main()
+"""
+TEST_MAIN_PY = MAIN_PY.replace(b"main()", b"test_main()")
+APPENDED_LINES = b"""
+    print("Hello")
+    print("Goodbye")
+"""
+
+
+def git(temp_dir: str, *args: str, output: bool = False, input: bytes = None) -> str:
+    """
+    Run a git command in temp_dir with the test identity passed as -c overrides.
+
+    stdout is only piped and decoded when output=True; otherwise it is discarded and
+    an empty string is returned. stderr is left alone so failures still show up.
+    input, if given, is fed to the command's stdin.
+    """
+    result = subprocess.run(['git', '-c', 'user.name=Test User', '-c', 'user.email=test@example.com',
+                             '-c', 'commit.gpgsign=false', '-c', 'core.fsync=none', '-c', 'gc.auto=0', *args],
+                            cwd=temp_dir, check=True, input=input,
+                            stdout=subprocess.PIPE if output else subprocess.DEVNULL)
+    return result.stdout.decode('ascii') if output else ''
+
+
+def bucket_changes(changes: list) -> dict:
+    """Group a chunk's changes by type in a single pass."""
+    buckets = {"add": [], "remove": [], "context": []}
+    for change in changes:
+        buckets[change.type].append(change)
+    return buckets
+
+
+def summarize_diff(files: list) -> list:
+    """(new_path, display_path, added lines per chunk) for each parsed file, for one-shot comparisons."""
+    return [
+        (f.new_path, f.display_path, [[change.content for change in bucket_changes(chunk.changes)["add"]] for chunk in f.chunks])
+        for f in files
+    ]
 
 
 def setup_git_repo(temp_dir: str) -> None:
     """Set up a git repository with test configuration."""
-    # Initialize git repo
-    subprocess.run(['git', 'init'], cwd=temp_dir, check=True)
-    
-    # Configure git for test environment
-    subprocess.run(['git', 'config', 'user.name', 'Test User'], cwd=temp_dir, check=True)
-    subprocess.run(['git', 'config', 'user.email', 'test@example.com'], cwd=temp_dir, check=True)
-    subprocess.run(['git', 'config', 'commit.gpgsign', 'false'], cwd=temp_dir, check=True)
+    # The identity comes from git()'s -c overrides, so no separate git config calls are needed;
+    # an empty --template skips copying the sample hooks the tests never use
+    git(temp_dir, 'init', '-q', '--template=')
+
+
+def commit_files(temp_dir: str, commits: list) -> list:
+    """
+    Create a chain of commits on refs/heads/main with a single git fast-import run.
+
+    Each commit is a (message, {path: bytes}) pair and builds on the previous one, so
+    files it does not list are carried over. Blobs, trees and commits are written
+    straight to the object database without touching the worktree or the index.
+    Returns the commit SHAs, oldest first.
+    """
+    stream = []
+    for message, files in commits:
+        message = message.encode()
+        stream.append(b'commit refs/heads/main\ncommitter Test User <test@example.com> 0 +0000\ndata %d\n%s\n'
+                      % (len(message), message))
+        for path, data in files.items():
+            stream.append(b'M 100644 inline %s\ndata %d\n%s\n' % (path.encode(), len(data), data))
+    git(temp_dir, 'fast-import', '--quiet', input=b''.join(stream))
+    return git(temp_dir, 'log', '-n%d' % len(commits), '--format=%H', 'refs/heads/main', output=True).split()[::-1]
 
 
 class TestDiffParser(unittest.TestCase):
@@ -42,24 +136,164 @@ def main():
         
         # Verify file1
         file1 = result[0]
-        self.assertEqual(file1.display_path, "src/file1.py")
+        self.assertEqual(file1.display_path, SRC_FILE1)
         self.assertEqual(len(file1.chunks), 2)
         
         # First chunk should have added line
         chunk1 = file1.chunks[0]
-        added_changes = [change for change in chunk1.changes if change["type"] == "add"]
-        context_changes = [change for change in chunk1.changes if change["type"] == "context"]
+        buckets = bucket_changes(chunk1.changes)
+        added_changes, context_changes = buckets["add"], buckets["context"]
         self.assertEqual(len(added_changes), 1, "Should have one added line")
         self.assertEqual(len(context_changes), 3, "Should have three context lines")
-        self.assertEqual(added_changes[0]["content"].strip(), "print(\"Hello\")")
+        self.assertEqual(added_changes[0].content, "    print(\"Hello\")")
         
         # Second chunk should have added line
         chunk2 = file1.chunks[1]
-        added_changes = [change for change in chunk2.changes if change["type"] == "add"]
-        context_changes = [change for change in chunk2.changes if change["type"] == "context"]
+        buckets = bucket_changes(chunk2.changes)
+        added_changes, context_changes = buckets["add"], buckets["context"]
         self.assertEqual(len(added_changes), 1, "Should have one added line")
         self.assertEqual(len(context_changes), 2, "Should have two context lines")
-        self.assertEqual(added_changes[0]["content"].strip(), "print(\"Goodbye\")")
+        self.assertEqual(added_changes[0].content, "    print(\"Goodbye\")")
+
+    def test_parse_hunk_header_positions(self):
+        diff_text = """\
+diff --git a/src/file1.py b/src/file1.py
+index 1234567..7654321 100644
+--- a/src/file1.py
++++ b/src/file1.py
+@@ -10,2 +12,3 @@ def main():
+     pass
++    print("Hello")
+-    return
+"""
+        result = parse_diff_text(diff_text)
+        self.assertEqual(len(result), 1)
+
+        chunk = result[0].chunks[0]
+        self.assertEqual(chunk.header, "@@ -10,2 +12,3 @@ def main():")
+        self.assertEqual((chunk.source_start, chunk.target_start), (10, 12))
+        # File header lines must not leak into the hunk
+        self.assertEqual([change.type for change in chunk.changes], ["context", "add", "remove"])
+        self.assertEqual(chunk.changes[1], Change(ln=2, ln2=None, content='    print("Hello")', type="add"))
+        self.assertEqual((chunk.changes[2].ln, chunk.changes[2].ln2), (None, 3))
+        self.assertTrue(chunk.has_reviewable_changes)
+        self.assertFalse(DiffChunk(header=chunk.header, lines=["-    return", "+", "+   ", " pass"]).has_reviewable_changes)
+        # The last hunk of the last file keeps its line mapping
+        self.assertEqual(result[0].hunk_line_mappings, [{1: (1, 1), 2: (2, 2)}])
+        self.assertEqual(chunk.hunk_line_mapping.lookup(2), (2, 2))
+        self.assertIsNone(chunk.hunk_line_mapping.lookup(3))
+        self.assertNotIn(3, chunk.hunk_line_mapping)
+
+    def test_content_for_llm_trims_distant_context(self):
+        lines = [f" ctx{i}" for i in range(1, 9)] + ["+\tadded   "] + [f" ctx{i}" for i in range(9, 11)]
+        chunk = DiffChunk(header="@@ -1,10 +1,11 @@", lines=lines)
+        self.assertEqual(chunk.content_for_llm.splitlines(), [
+            "@@ -1,10 +1,11 @@",
+            "6 ctx6",
+            "7 ctx7",
+            "8 ctx8",
+            "9     added",
+            "10 ctx9",
+            "11 ctx10",
+        ])
+
+    def test_format_for_llm_line_offset(self):
+        chunk = DiffChunk(header="@@ -10,2 +11,3 @@", lines=[" a", "-b", "+c", "+d"])
+        self.assertEqual(chunk.llm_line_count, 3)
+        self.assertEqual(chunk.format_for_llm(line_offset=3).splitlines(), [
+            "@@ -10,2 +11,3 @@",
+            "4 a",
+            "5 b",
+            "5 c",
+            "6 d",
+        ])
+
+    def test_parse_paths_containing_ab_segments(self):
+        diff_text = """\
+diff --git a/lib/a/b/util.py b/lib/a/b/util.py
+index 1234567..7654321 100644
+--- a/lib/a/b/util.py
++++ b/lib/a/b/util.py
+@@ -1 +1 @@
+-x = 1
++x = 2
+"""
+        result = parse_diff_text(diff_text)
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0].old_path, "lib/a/b/util.py")
+        self.assertEqual(result[0].new_path, "lib/a/b/util.py")
+
+    def test_parse_bytes_diff(self):
+        diff_text = """\
+diff --git a/src/caf\u00e9.py b/src/caf\u00e9.py
+index 1234567..7654321 100644
+--- a/src/caf\u00e9.py
++++ b/src/caf\u00e9.py
+@@ -1 +1 @@
+-name = "cafe"
++name = "caf\u00e9"
+diff --git a/vendor/blob.bin b/vendor/blob.bin
+index 1234567..7654321 100644
+--- a/vendor/blob.bin
++++ b/vendor/blob.bin
+@@ -1 +1 @@
+-x
++x
+"""
+        raw = diff_text.encode("utf-8") + b"+\xff\xfe not utf-8\n"
+        self.assertEqual(parse_diff_text(raw), parse_diff_text(raw.decode("utf-8", "replace")))
+
+        result = parse_diff_text(raw, exclude_patterns=["vendor/**"])
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0].new_path, "src/caf\u00e9.py")
+        self.assertEqual(result[0].chunks[0].changes[1].content, 'name = "caf\u00e9"')
+
+        # Each file header goes through the path filter once, whether the diff is bytes or text
+        for diff in (raw, raw.decode("utf-8", "replace")):
+            checked = []
+            keep_path = lambda path: checked.append(path) or not path.startswith("vendor/")
+            self.assertEqual(parse_diff_text(diff, path_filter=keep_path), result)
+            self.assertEqual(checked, ["src/caf\u00e9.py", "vendor/blob.bin"])
+
+    def test_malformed_hunk_header_drops_its_lines(self):
+        diff_text = """\
+diff --git a/app.py b/app.py
+--- a/app.py
++++ b/app.py
+@@ -1 +1,2 @@
+ a = 1
++b = 2
+@@ not a hunk header @@
++stray = 3
+@@ -10 +11,2 @@
+ c = 4
++d = 5
+"""
+        chunks = parse_diff_text(diff_text)[0].chunks
+        self.assertEqual([chunk.lines for chunk in chunks], [[" a = 1", "+b = 2"], [" c = 4", "+d = 5"]])
+
+    def test_parse_empty_diff(self):
+        for diff_text in ("", " \n\t\n", b"", b"\n", [], None):
+            self.assertEqual(parse_diff_text(diff_text), [])
+
+    def test_iter_lines_chunked(self):
+        data = b"diff --git a/x b/x\n@@ -1 +1 @@\n+a\r\n\n-b"
+        for chunk_size in (1, 4, 64):
+            lines = list(iter_lines_chunked(io.BytesIO(data), chunk_size=chunk_size))
+            self.assertEqual(lines, [b"diff --git a/x b/x", b"@@ -1 +1 @@", b"+a\r", b"", b"-b"])
+
+    def test_parse_git_generated_diff(self):
+        result = parse_diff_text(GIT_DIFF_SIMPLE)
+
+        # Both files gain one line in each of their two hunks
+        added_lines = [['    print("Hello")'], ['    print("Goodbye")']]
+        self.assertEqual(summarize_diff(result), [
+            (SRC_FILE1, SRC_FILE1, added_lines),
+            (SRC_FILE2, SRC_FILE2, added_lines),
+        ])
+
+        # Each hunk of file1 maps its single line
+        self.assertEqual([dict(mapping) for mapping in result[0].hunk_line_mappings], [{1: (1, 1)}, {1: (1, 1)}])
 
     def test_parse_diff_with_excludes(self):
         # Test with a known diff output
@@ -85,294 +319,103 @@ def test_main():
         # Test with exclude patterns
         result = parse_diff_text(diff_text, exclude_patterns=["**/tests/**"])
         self.assertEqual(len(result), 1)  # Only src/file1.py should be included
-        self.assertEqual(result[0].display_path, "src/file1.py")
+        self.assertEqual(result[0].display_path, SRC_FILE1)
 
         # Test with include patterns
         result = parse_diff_text(diff_text, include_patterns=["src/*.py"])
         self.assertEqual(len(result), 1)  # Only src/file1.py should be included
-        self.assertEqual(result[0].display_path, "src/file1.py")
+        self.assertEqual(result[0].display_path, SRC_FILE1)
 
         # Test with both include and exclude patterns
         result = parse_diff_text(diff_text, include_patterns=["*.py"], exclude_patterns=["**/tests/**"])
         self.assertEqual(len(result), 1)  # Only src/file1.py should be included
-        self.assertEqual(result[0].new_path, "src/file1.py")
+        self.assertEqual(result[0].new_path, SRC_FILE1)
 
 
 class TestGitDiffParser(unittest.TestCase):
-    def test_parse_simple_diff(self):
-        # Create a temporary git repository
-        with tempfile.TemporaryDirectory() as temp_dir:
-            subprocess.run(['git', 'init'], cwd=temp_dir)
-            
-            # Create initial file
-            file1_path = os.path.join(temp_dir, 'src', 'file1.py')
-            os.makedirs(os.path.dirname(file1_path), exist_ok=True)
-            with open(file1_path, 'w') as f:
-                f.write("""
-def main():
-    pass
+    @classmethod
+    def setUpClass(cls):
+        # One repository shared by all tests, so git only runs once per class;
+        # base..excludes appends lines to src/file1.py and tests/test_file.py
+        cls.temp_dir = tempfile.mkdtemp(dir=FIXTURE_TMP_DIR)
+        temp_dir = cls.temp_dir
+        setup_git_repo(temp_dir)
 
-if __name__ == '__main__':
-    main()
-""")
-            
-            # Create second file
-            file2_path = os.path.join(temp_dir, 'src', 'file2.py')
-            with open(file2_path, 'w') as f:
-                f.write("""
-def main():
-    pass
+        base_sha, excludes_sha = commit_files(temp_dir, [
+            ('Initial commit', {SRC_FILE1: MAIN_PY, TESTS_FILE: TEST_MAIN_PY}),
+            # Append to src/file1.py and tests/test_file.py
+            ('Update src and test files', {SRC_FILE1: MAIN_PY + APPENDED_LINES, TESTS_FILE: TEST_MAIN_PY + APPENDED_LINES}),
+        ])
 
-if __name__ == '__main__':
-    main()
-""")
-            
-            # Stage and commit initial files
-            subprocess.run(['git', 'add', '.'], cwd=temp_dir)
-            subprocess.run(['git', 'commit', '-m', 'Initial commit'], cwd=temp_dir)
-            
-            # Get initial commit hash
-            base_sha = subprocess.run(['git', 'rev-parse', 'HEAD'], 
-                                    cwd=temp_dir, 
-                                    capture_output=True, 
-                                    text=True).stdout.strip()
-            
-            # Modify files
-            with open(file1_path, 'w') as f:
-                f.write("""
-def main():
-    print("Hello")
-    pass
-
-if __name__ == '__main__':
-    main()
-    print("Goodbye")
-""")
-            
-            with open(file2_path, 'w') as f:
-                f.write("""
-def main():
-    print("Hello")
-    pass
+        # Kept as a list of lines, since each test parses it several times
+        cls.diff_lines_excludes = list(get_git_diff(base_sha, excludes_sha, cwd=temp_dir))
 
-if __name__ == '__main__':
-    main()
-    print("Goodbye")
-""")
-            
-            # Stage and commit changes
-            subprocess.run(['git', 'add', '.'], cwd=temp_dir, check=True)
-            subprocess.run(['git', 'commit', '-m', 'Update files'], cwd=temp_dir, check=True)
-            head_sha = subprocess.run(['git', 'rev-parse', 'HEAD'], 
-                                    cwd=temp_dir, 
-                                    capture_output=True, 
-                                    text=True, 
-                                    check=True).stdout.strip()
-            
-            # Get diff
-            diff_text = get_git_diff(base_sha, head_sha, cwd=temp_dir)
-            result = parse_diff_text(diff_text)
-            
-            # Verify results
-            self.assertEqual(len(result), 2)
-            
-            # Verify file1
-            file1 = result[0]
-            self.assertEqual(file1.new_path, "src/file1.py")
-            self.assertEqual(len(file1.chunks), 2)
-            
-            # First chunk should have one added line
-            added_changes = [change for change in file1.chunks[0].changes if change["type"] == "add"]
-            self.assertEqual(len(added_changes), 1, "Should have one added line")
-            self.assertEqual(added_changes[0]["content"].strip(), "print(\"Hello\")")
-            
-            # Second chunk should have one added line
-            added_changes = [change for change in file1.chunks[1].changes if change["type"] == "add"]
-            self.assertEqual(len(added_changes), 1, "Should have one added line")
-            self.assertEqual(added_changes[0]["content"].strip(), "print(\"Goodbye\")")
-            
-            # Verify file2
-            file2 = result[1]
-            self.assertEqual(file2.new_path, "src/file2.py")
-            self.assertEqual(len(file2.chunks), 2)
-            
-            # First chunk should have one added line
-            added_changes = [change for change in file2.chunks[0].changes if change["type"] == "add"]
-            self.assertEqual(len(added_changes), 1, "Should have one added line")
-            self.assertEqual(added_changes[0]["content"].strip(), "print(\"Hello\")")
-            
-            # Second chunk should have one added line
-            added_changes = [change for change in file2.chunks[1].changes if change["type"] == "add"]
-            self.assertEqual(len(added_changes), 1, "Should have one added line")
-            self.assertEqual(added_changes[0]["content"].strip(), "print(\"Goodbye\")")
-        
-        # Should have 2 files
-        self.assertEqual(len(result), 2)
-        
-        # File 1 should have 2 hunks
-        file1 = result[0]
-        self.assertEqual(file1.new_path, "src/file1.py")
-        self.assertEqual(file1.display_path, "src/file1.py")
-        self.assertEqual(len(file1.chunks), 2)
-        
-        # First chunk of file1 should have added line
-        hunk1 = file1.chunks[0]
-        added_changes = [change for change in hunk1.changes if change["type"] == "add"]
-        self.assertEqual(len(added_changes), 1)
-        self.assertEqual(added_changes[0]["content"].strip(), "print(\"Hello\")")
-        
-        # Second chunk of file1 should have added line
-        hunk2 = file1.chunks[1]
-        added_changes = [change for change in hunk2.changes if change["type"] == "add"]
-        self.assertEqual(len(added_changes), 1)
-        self.assertEqual(added_changes[0]["content"].strip(), "print(\"Goodbye\")")
-        
-        # File 2 should be identical to file1
-        file2 = result[1]
-        self.assertEqual(file2.display_path, "src/file2.py")
-        self.assertEqual(len(file2.chunks), 2)
-        
-        # Print debug info
-        print("\nHunk 0 line mappings:", file1.hunk_line_mappings[0])
-        print("Hunk 1 line mappings:", file1.hunk_line_mappings[1])
-        
-        # Verify line numbers mapping
-        # First hunk should have one line number mapping
-        self.assertEqual(len(file1.hunk_line_mappings[0]), 1)
-        self.assertEqual(file1.hunk_line_mappings[0][1], (1, 1))
-        
-        # Second hunk should have one line number mapping
-        self.assertEqual(len(file1.hunk_line_mappings[1]), 1)
-        self.assertEqual(file1.hunk_line_mappings[1][1], (1, 1))
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.temp_dir, ignore_errors=True)
 
     def test_parse_diff_with_excludes(self):
-        # Create a temporary git repository
-        with tempfile.TemporaryDirectory() as temp_dir:
-            subprocess.run(['git', 'init'], cwd=temp_dir)
-            
-            # Create files
-            file1_path = os.path.join(temp_dir, 'src', 'file1.py')
-            os.makedirs(os.path.dirname(file1_path), exist_ok=True)
-            with open(file1_path, 'w') as f:
-                f.write("""
-def main():
-    pass
+        diff_text = self.diff_lines_excludes
 
-if __name__ == '__main__':
-    main()
-""")
-            
-            test_file_path = os.path.join(temp_dir, 'tests', 'test_file.py')
-            os.makedirs(os.path.dirname(test_file_path), exist_ok=True)
-            with open(test_file_path, 'w') as f:
-                f.write("""
-def test_main():
-    pass
+        # Test with exclude patterns
+        result = parse_diff_text(diff_text, exclude_patterns=["**/tests/**"])
+        self.assertEqual(len(result), 1)  # Only src/file1.py should be included
+        self.assertEqual(result[0].new_path, SRC_FILE1)
 
-if __name__ == '__main__':
-    test_main()
-""")
-            
-            # Stage and commit initial files
-            subprocess.run(['git', 'add', '.'], cwd=temp_dir)
-            subprocess.run(['git', 'commit', '-m', 'Initial commit'], cwd=temp_dir)
-            
-            # Get initial commit hash
-            base_sha = subprocess.run(['git', 'rev-parse', 'HEAD'], 
-                                    cwd=temp_dir, 
-                                    capture_output=True, 
-                                    text=True).stdout.strip()
-            
-            # Modify files
-            with open(file1_path, 'a') as f:
-                f.write("""
-    print("Hello")
-    print("Goodbye")
-""")
-            
-            with open(test_file_path, 'a') as f:
-                f.write("""
-    print("Hello")
-    print("Goodbye")
-""")
-            
-            # Stage and commit changes
-            subprocess.run(['git', 'add', '.'], cwd=temp_dir)
-            subprocess.run(['git', 'commit', '-m', 'Update files'], cwd=temp_dir)
-            
-            # Get diff
-            diff_text = get_git_diff(base_sha, "HEAD", cwd=temp_dir)
-            
-            # Test with exclude patterns
-            result = parse_diff_text(diff_text, exclude_patterns=["**/tests/**"])
-            self.assertEqual(len(result), 1)  # Only src/file1.py should be included
-            self.assertEqual(result[0].new_path, "src/file1.py")
-
-            # Test with include patterns
-            result = parse_diff_text(diff_text, include_patterns=["src/*.py"])
-            self.assertEqual(len(result), 1)  # Only src/file1.py should be included
-            self.assertEqual(result[0].new_path, "src/file1.py")
-
-            # Test with both include and exclude patterns
-            result = parse_diff_text(diff_text, include_patterns=["*.py"], exclude_patterns=["**/tests/**"])
-            self.assertEqual(len(result), 1)  # Only src/file1.py should be included
-            self.assertEqual(result[0].new_path, "src/file1.py")
+        # Test with include patterns
+        result = parse_diff_text(diff_text, include_patterns=["src/*.py"])
+        self.assertEqual(len(result), 1)  # Only src/file1.py should be included
+        self.assertEqual(result[0].new_path, SRC_FILE1)
+
+        # Test with both include and exclude patterns
+        result = parse_diff_text(diff_text, include_patterns=["*.py"], exclude_patterns=["**/tests/**"])
+        self.assertEqual(len(result), 1)  # Only src/file1.py should be included
+        self.assertEqual(result[0].new_path, SRC_FILE1)
 
 class TestGitDiff(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.mkdtemp(dir=FIXTURE_TMP_DIR)
+        temp_dir = cls.temp_dir
+        # Set up git repository
+        setup_git_repo(temp_dir)
+        
+        cls.base_sha, cls.head_sha = commit_files(temp_dir, [
+            ('Initial commit', {SRC_FILE1: MAIN_PY}),
+            ('Update files', {SRC_FILE1: MAIN_PY + APPENDED_LINES}),
+        ])
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.temp_dir, ignore_errors=True)
+
     def test_get_git_diff(self):
-        # Test git diff functionality
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Set up git repository
-            setup_git_repo(temp_dir)
-            
-            # Create initial file
-            file1_path = os.path.join(temp_dir, 'src', 'file1.py')
-            os.makedirs(os.path.dirname(file1_path), exist_ok=True)
-            with open(file1_path, 'w') as f:
-                f.write("""\
-def main():
-    pass
+        temp_dir, base_sha, head_sha = self.temp_dir, self.base_sha, self.head_sha
 
-if __name__ == '__main__':
-    main()
-""")
-            
-            # Stage and commit initial file
-            subprocess.run(['git', 'add', '.'], cwd=temp_dir, check=True)
-            subprocess.run(['git', 'commit', '-m', 'Initial commit'], cwd=temp_dir, check=True)
-            base_sha = subprocess.run(['git', 'rev-parse', 'HEAD'], 
-                                    cwd=temp_dir, 
-                                    capture_output=True, 
-                                    text=True, 
-                                    check=True).stdout.strip()
-            
-            # Modify file
-            with open(file1_path, 'a') as f:
-                f.write("""
-    print("Hello")
-    print("Goodbye")
-""")
-            
-            # Stage and commit changes
-            subprocess.run(['git', 'add', '.'], cwd=temp_dir, check=True)
-            subprocess.run(['git', 'commit', '-m', 'Update files'], cwd=temp_dir, check=True)
-            head_sha = subprocess.run(['git', 'rev-parse', 'HEAD'], 
-                                    cwd=temp_dir, 
-                                    capture_output=True, 
-                                    text=True, 
-                                    check=True).stdout.strip()
-            
-            # Get diff
-            diff_text = get_git_diff(base_sha, head_sha, cwd=temp_dir)
-            
-            # Parse the diff
-            files = parse_diff_text(diff_text)
-            
-            # Verify diff contains expected changes
-            self.assertEqual(len(files), 1)
-            self.assertEqual(files[0].new_path, "src/file1.py")
-            self.assertTrue(any("print(\"Hello\")" in change["content"] for change in files[0].chunks[0].changes if change["type"] == "add"))
-            self.assertTrue(any("print(\"Goodbye\")" in change["content"] for change in files[0].chunks[0].changes if change["type"] == "add"))
+        # Parse the diff while git streams it
+        files = parse_diff_text(get_git_diff(base_sha, head_sha, cwd=temp_dir))
+        
+        # Verify diff contains expected changes
+        self.assertEqual(len(files), 1)
+        self.assertEqual(files[0].new_path, SRC_FILE1)
+        added_changes = bucket_changes(files[0].chunks[0].changes)["add"]
+        self.assertTrue(any("print(\"Hello\")" in change.content for change in added_changes))
+        self.assertTrue(any("print(\"Goodbye\")" in change.content for change in added_changes))
+
+        # The whole output, decoded, parses identically
+        diff_text = b"\n".join(get_git_diff(base_sha, head_sha, cwd=temp_dir)).decode("utf-8")
+        self.assertEqual(parse_diff_text(diff_text), files)
+
+        # The memoized variant returns equal but independent copies
+        parsed_once = get_parsed_diff(base_sha, head_sha, cwd=temp_dir)
+        parsed_twice = get_parsed_diff(base_sha, head_sha, cwd=temp_dir)
+        self.assertEqual(parsed_once, files)
+        self.assertEqual(parsed_twice, files)
+        self.assertIsNot(parsed_once[0], parsed_twice[0])
+
+        # A failing git command still surfaces as CalledProcessError
+        with self.assertRaises(subprocess.CalledProcessError):
+            list(get_git_diff(base_sha, "0" * 40, cwd=temp_dir))
 
 
 if __name__ == '__main__':
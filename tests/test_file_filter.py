@@ -0,0 +1,51 @@
+import unittest
+from src.drone_ai_pr_reviewer.diff_parser import parse_diff_text
+from src.drone_ai_pr_reviewer.utils.file_filter import _compile_matcher, compile_path_filter, filter_files_by_patterns
+
+DIFF = """\
+diff --git a/src/app.py b/src/app.py
+index 1234567..7654321 100644
+--- a/src/app.py
++++ b/src/app.py
+@@ -1 +1,2 @@
+ a = 1
++b = 2
+diff --git a/vendor/lib.py b/vendor/lib.py
+index 1234567..7654321 100644
+--- a/vendor/lib.py
++++ b/vendor/lib.py
+@@ -1 +1,2 @@
+ c = 3
++d = 4
+"""
+
+
+class TestFileFilter(unittest.TestCase):
+    def test_patterns_are_compiled_once(self):
+        _compile_matcher.cache_clear()
+        self.addCleanup(_compile_matcher.cache_clear)
+        for _ in range(3):
+            files = parse_diff_text(DIFF, include_patterns=["*.py"], exclude_patterns=["vendor/**"])
+            self.assertEqual([f.new_path for f in files], ["src/app.py"])
+        info = _compile_matcher.cache_info()
+        # One compile per pattern list on the first parse, cache hits after that
+        self.assertEqual((info.misses, info.hits), (2, 4))
+
+    def test_union_and_negated_patterns(self):
+        files = ["src/app.py", "src/gen/api.py", "docs/index.md", "README.md"]
+        # (include patterns, exclude patterns, kept files)
+        cases = [
+            (["src/**", "*.md"], None, files),
+            (None, ["docs/", "src/gen/*"], ["src/app.py", "README.md"]),
+            (None, ["*.md", "!README.md"], ["src/app.py", "src/gen/api.py", "README.md"]),
+            (["src/**"], ["src/gen/**"], ["src/app.py"]),
+        ]
+        for include, exclude, expected in cases:
+            with self.subTest(include=include, exclude=exclude):
+                self.assertEqual(filter_files_by_patterns(files, include, exclude), expected)
+                keep_path = compile_path_filter(include, exclude)
+                self.assertEqual([f for f in files if keep_path(f)], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
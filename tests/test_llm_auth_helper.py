@@ -0,0 +1,43 @@
+import os
+import unittest
+from unittest import mock
+from src.drone_ai_pr_reviewer.llm_auth_helper import setup_liteLLM_provider_specific_env
+from src.drone_ai_pr_reviewer.plugin_config import PluginConfig
+
+
+def make_config(**overrides) -> PluginConfig:
+    return PluginConfig(**{"llm_model": "gpt-4o", "scm_token": "test-token", "llm_api_key": "sk-one", **overrides})
+
+
+class TestProviderEnv(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(os.environ, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_exports_provider_variables(self):
+        self.assertTrue(setup_liteLLM_provider_specific_env(make_config(llm_api_base="https://llm.test")))
+        self.assertEqual(os.environ, {"OPENAI_API_KEY": "sk-one", "OPENAI_API_BASE": "https://llm.test"})
+
+    def test_same_config_is_exported_again_after_env_changes(self):
+        config = make_config()
+        self.assertTrue(setup_liteLLM_provider_specific_env(config))
+        del os.environ["OPENAI_API_KEY"]
+        self.assertTrue(setup_liteLLM_provider_specific_env(config))
+        self.assertEqual(os.environ["OPENAI_API_KEY"], "sk-one")
+
+    def test_rotated_key_replaces_the_old_one(self):
+        self.assertTrue(setup_liteLLM_provider_specific_env(make_config()))
+        self.assertTrue(setup_liteLLM_provider_specific_env(make_config(llm_api_key="sk-two")))
+        self.assertEqual(os.environ["OPENAI_API_KEY"], "sk-two")
+
+    def test_unset_settings_are_skipped(self):
+        os.environ["AZURE_API_KEY"] = "from-ci"
+        config = make_config(llm_model="azure/gpt-4o", llm_api_key=None)
+        self.assertEqual(config.llm_provider, "azure")
+        self.assertTrue(setup_liteLLM_provider_specific_env(config))
+        # Neither the unset key nor the unset API version fail setup or clear what is already set
+        self.assertEqual(os.environ, {"AZURE_API_KEY": "from-ci"})
+
+if __name__ == '__main__':
+    unittest.main()
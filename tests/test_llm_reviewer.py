@@ -0,0 +1,205 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+import httpx
+import litellm
+from src.drone_ai_pr_reviewer.llm_reviewer import (
+    LLMReviewer, _TokenBucket, _LLM_BACKOFF_INITIAL, _LLM_MAX_ATTEMPTS, _LLM_RETRY_AFTER_MAX
+)
+from src.drone_ai_pr_reviewer.plugin_config import PluginConfig
+
+
+def make_reviewer(**overrides) -> LLMReviewer:
+    """An LLMReviewer over a minimal configuration; nothing is sent unless a test calls the LLM."""
+    config = PluginConfig(**{"llm_model": "gpt-4o", "scm_token": "test-token", **overrides})
+    return LLMReviewer(config)
+
+
+class TestConcurrentReviews(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.reviewer = make_reviewer(llm_concurrency=2, llm_qps=0)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+        # Later chunks finish first, so completion order differs from input order
+        async def fake_review(file_path, diff_chunk_content):
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                await asyncio.sleep(0.01 * (10 - int(diff_chunk_content)))
+                if diff_chunk_content == "3":
+                    raise ValueError("review failed")
+                return [{"lineNumber": 1, "reviewComment": diff_chunk_content}]
+            finally:
+                self.in_flight -= 1
+
+        self.reviewer.get_review_for_chunk = fake_review
+        self.chunks = [("f.py", str(i)) for i in range(6)]
+
+    async def asyncTearDown(self):
+        await self.reviewer.aclose()
+
+    async def test_concurrency_is_capped(self):
+        results = [result async for result in self.reviewer.iter_reviews_for_chunks(self.chunks)]
+        self.assertEqual(len(results), len(self.chunks))
+        self.assertEqual(self.max_in_flight, self.reviewer.config.llm_concurrency)
+
+    async def test_errors_are_yielded_not_raised(self):
+        results = dict([result async for result in self.reviewer.iter_reviews_for_chunks(self.chunks)])
+        self.assertIsInstance(results[3], ValueError)
+        self.assertEqual(results[0], [{"lineNumber": 1, "reviewComment": "0"}])
+
+    async def test_results_keep_input_order(self):
+        results = await self.reviewer.get_reviews_for_chunks(self.chunks)
+        self.assertIsInstance(results[3], ValueError)
+        self.assertEqual(
+            [result[0]["reviewComment"] for i, result in enumerate(results) if i != 3],
+            ["0", "1", "2", "4", "5"]
+        )
+
+
+class TestTokenBucket(unittest.IsolatedAsyncioTestCase):
+    async def test_limits_request_rate(self):
+        bucket = _TokenBucket(20)
+        start = time.monotonic()
+        # One second of burst goes through at once...
+        for _ in range(20):
+            await bucket.acquire()
+        self.assertLess(time.monotonic() - start, 0.1)
+        # ...after which requests are spaced 1/rate apart
+        for _ in range(5):
+            await bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+
+def rate_limit_error(retry_after: str = None) -> Exception:
+    headers = {"Retry-After": retry_after} if retry_after else {}
+    response = httpx.Response(429, headers=headers, request=httpx.Request("POST", "https://llm.test"))
+    return litellm.exceptions.RateLimitError("slow down", "openai", "gpt-4o", response=response)
+
+
+class TestCallLLMRetries(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.reviewer = make_reviewer()
+        self.sleep = mock.AsyncMock()
+        patcher = mock.patch("src.drone_ai_pr_reviewer.llm_reviewer.asyncio.sleep", self.sleep)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def asyncTearDown(self):
+        await self.reviewer.aclose()
+
+    async def call(self, side_effect):
+        with mock.patch("litellm.acompletion", mock.AsyncMock(side_effect=side_effect)) as acompletion:
+            try:
+                return await self.reviewer._call_llm({"model": "gpt-4o", "messages": []})
+            finally:
+                self.calls = acompletion.await_count
+
+    async def test_retries_transient_errors(self):
+        connection_error = litellm.exceptions.APIConnectionError("reset", "openai", "gpt-4o")
+        result = await self.call([rate_limit_error(), connection_error, "response"])
+        self.assertEqual(result, "response")
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(self.sleep.await_count, 2)
+        # Jittered exponential backoff: 1x-1.5x of the initial delay, then of twice that
+        first, second = (call.args[0] for call in self.sleep.await_args_list)
+        self.assertTrue(_LLM_BACKOFF_INITIAL <= first <= 1.5 * _LLM_BACKOFF_INITIAL)
+        self.assertTrue(2 * _LLM_BACKOFF_INITIAL <= second <= 3 * _LLM_BACKOFF_INITIAL)
+
+    async def test_reraises_after_max_attempts(self):
+        with self.assertRaises(litellm.exceptions.RateLimitError):
+            await self.call(rate_limit_error()) # Raised on every attempt
+        self.assertEqual(self.calls, _LLM_MAX_ATTEMPTS)
+        self.assertEqual(self.sleep.await_count, _LLM_MAX_ATTEMPTS - 1)
+
+    async def test_honors_retry_after(self):
+        await self.call([rate_limit_error("10"), "response"])
+        self.sleep.assert_awaited_once_with(10.0)
+
+    async def test_caps_retry_after(self):
+        await self.call([rate_limit_error("3600"), "response"])
+        self.sleep.assert_awaited_once_with(_LLM_RETRY_AFTER_MAX)
+
+    async def test_does_not_retry_other_errors(self):
+        error = litellm.exceptions.APIError(500, "server error", "openai", "gpt-4o",
+                                            request=httpx.Request("POST", "https://llm.test"))
+        with self.assertRaises(litellm.exceptions.APIError):
+            await self.call([error, "response"])
+        self.assertEqual(self.calls, 1)
+        self.sleep.assert_not_awaited()
+
+
+class TestModelCapabilities(unittest.IsolatedAsyncioTestCase):
+    async def test_capabilities_are_looked_up_once(self):
+        for model, supports_schema, response_format in [
+            ("gpt-4o", True, "json_schema"),
+            ("gpt-4-0613", False, "json_object"),
+            ("some-local-model", False, None),
+        ]:
+            with self.subTest(model=model):
+                with mock.patch("litellm.supports_response_schema", return_value=supports_schema) as lookup:
+                    reviewer = make_reviewer(llm_model=model)
+                await reviewer.aclose()
+                lookup.assert_called_once_with(model=model)
+                self.assertEqual(reviewer._base_kwargs.get("response_format", {}).get("type"), response_format)
+
+
+def llm_response(content: str) -> SimpleNamespace:
+    """The parts of a LiteLLM completion response get_review_for_chunk reads."""
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class TestReviewCaching(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.cache_dir = temp_dir.name
+        self.reviewer = make_reviewer(cache_dir=self.cache_dir,
+                                      checkpoint_path=os.path.join(self.cache_dir, "checkpoint.jsonl"))
+
+    async def asyncTearDown(self):
+        await self.reviewer.aclose()
+
+    async def review_twice(self, content: str) -> int:
+        """Reviews a chunk twice, answering with content; returns how many times the LLM was called."""
+        chunk = f"@@ -1 +1 @@\n1 x = {len(content)}" # One chunk per response, so each has its own cache entry
+        with mock.patch("litellm.acompletion", mock.AsyncMock(return_value=llm_response(content))) as acompletion:
+            first = await self.reviewer.get_review_for_chunk("app.py", chunk)
+            second = await self.reviewer.get_review_for_chunk("app.py", chunk)
+        self.assertEqual(first, second)
+        return acompletion.await_count
+
+    def persisted(self) -> tuple:
+        with open(os.path.join(self.cache_dir, "checkpoint.jsonl"), encoding="utf-8") as f:
+            checkpoint_lines = f.read().splitlines()
+        return os.listdir(os.path.join(self.cache_dir, "reviews")), checkpoint_lines
+
+    async def test_well_formed_responses_are_reused(self):
+        for content in ('{"reviews": [{"lineNumber": 1, "reviewComment": "Name x."}]}', '{"reviews": []}'):
+            with self.subTest(content=content):
+                self.assertEqual(await self.review_twice(content), 1)
+        cache_files, checkpoint_lines = self.persisted()
+        self.assertEqual((len(cache_files), len(checkpoint_lines)), (2, 2))
+
+    async def test_malformed_responses_are_not_persisted(self):
+        cases = [
+            '["not", "an", "object"]',
+            '{"comments": []}',
+            '{"reviews": "none"}',
+            '{"reviews": [{"lineNumber": 1, "reviewComment": "Name x."}, {"lineNumber": 2}]}',
+            '{"reviews": [{"lineNumber": "one", "reviewComment": "Name x."}]}',
+            '{"reviews": [',
+        ]
+        for content in cases:
+            with self.subTest(content=content):
+                self.assertEqual(await self.review_twice(content), 2)
+        self.assertEqual(self.persisted(), ([], []))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+import threading
+import unittest
+from unittest import mock
+from urllib3.exceptions import ProtocolError
+from src.drone_ai_pr_reviewer.main import review_pr, _batch_file_chunks, _locate_hunk_line
+from src.drone_ai_pr_reviewer.diff_parser import parse_diff_text
+from src.drone_ai_pr_reviewer.llm_reviewer import LLMReviewer
+from src.drone_ai_pr_reviewer.plugin_config import PluginConfig
+from src.drone_ai_pr_reviewer.utils.constants import LLM_MAX_CHUNK_CHARS
+
+# One file whose hunks are, in order: reviewable (3 lines), deletions only, reviewable (3 lines),
+# over LLM_MAX_CHUNK_CHARS, and reviewable (2 lines)
+BATCHED_DIFF = """\
+diff --git a/app.py b/app.py
+index 1234567..7654321 100644
+--- a/app.py
++++ b/app.py
+@@ -1,2 +1,3 @@
+ a = 1
++b = 2
+ c = 3
+@@ -10,2 +11,1 @@
+ d = 4
+-e = 5
+@@ -20,2 +20,3 @@
+ f = 6
++g = 7
+ h = 8
+@@ -30,1 +31,2 @@
+ i = 9
++j = "%s"
+@@ -40,1 +42,2 @@
+ k = 10
++l = 11
+""" % ("x" * LLM_MAX_CHUNK_CHARS)
+
+
+class FakeSCMClient:
+    """Serves a fixed diff and records the review comments posted."""
+    def __init__(self, diff_text: str):
+        self.diff_text = diff_text
+        self.posted = []
+
+    def get_pr_details(self):
+        return True
+
+    def stream_pr_diff(self):
+        return iter(self.diff_text.encode().splitlines())
+
+    def stream_pr_diff_dropped(self):
+        """Like stream_pr_diff, but the connection drops half way through."""
+        lines = self.diff_text.encode().splitlines()
+        yield from lines[:len(lines) // 2]
+        raise ProtocolError("Connection broken: IncompleteRead")
+
+    def post_review_comments(self, comments):
+        self.posted.extend(comments)
+        return True
+
+
+class TestChunkBatching(unittest.TestCase):
+    def setUp(self):
+        self.diff_file = parse_diff_text(BATCHED_DIFF)[0]
+        hunk1, _, hunk3, _, _ = self.diff_file.chunks
+        # Room for the first and third hunks only, so the last one starts a second request
+        self.batch_max_chars = len(hunk1.content_for_llm) + len(hunk3.format_for_llm(hunk1.llm_line_count))
+
+    def batch(self):
+        with mock.patch("src.drone_ai_pr_reviewer.main.LLM_BATCH_MAX_CHARS", self.batch_max_chars):
+            return _batch_file_chunks(self.diff_file)
+
+    def test_skipped_hunks_take_no_line_numbers(self):
+        batches, skipped = self.batch()
+        self.assertEqual(skipped, 2)
+        self.assertEqual([offsets for _, offsets, _ in batches], [[0, 3], [0]])
+        self.assertEqual([indices for _, _, indices in batches], [[0, 2], [4]])
+        first_request, second_request = (content for content, _, _ in batches)
+        # The third hunk is numbered straight after the first: 4-6, not after the skipped hunk's lines
+        self.assertIn("1 a = 1\n2 b = 2\n3 c = 3", first_request)
+        self.assertIn("4 f = 6\n5 g = 7\n6 h = 8", first_request)
+        self.assertTrue(second_request.startswith("@@ -40,1 +42,2 @@\n1 k = 10\n2 l = 11"))
+
+    def test_line_numbers_map_back_to_their_hunk(self):
+        offsets = self.batch()[0][0][1]
+        self.assertEqual(_locate_hunk_line(offsets, 1), (0, 1))
+        self.assertEqual(_locate_hunk_line(offsets, 3), (0, 3))  # Last line of the first hunk
+        self.assertEqual(_locate_hunk_line(offsets, 4), (1, 1))  # First line of the next one
+        self.assertEqual(_locate_hunk_line(offsets, 6), (1, 3))
+        self.assertEqual(_locate_hunk_line([0], 2), (0, 2))
+        self.assertIsNone(_locate_hunk_line(offsets, 0))
+
+    def test_diff_positions_continue_across_hunks(self):
+        # Each hunk header after the first takes a position: the hunks span 1-3, 5-6, 8-10, 12-13 and 15-16
+        positions = [self.diff_file.diff_position(chunk_idx, 1) for chunk_idx in range(5)]
+        self.assertEqual(positions, [1, 5, 8, 12, 15])
+        self.assertEqual(self.diff_file.diff_position(2, 3), 10)
+        self.assertIsNone(self.diff_file.diff_position(2, 4))
+
+
+class TestReviewPR(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.config = PluginConfig(llm_model="gpt-4o", scm_token="test-token",
+                                   is_pr_event=True, is_pr_opened_event=True)
+        self.reviewer = LLMReviewer(self.config)
+
+    async def asyncTearDown(self):
+        await self.reviewer.aclose()
+
+    async def test_binary_and_metadata_only_changes_are_not_sent(self):
+        diff_text = """\
+diff --git a/logo.png b/logo.png
+index 1234567..89abcde 100644
+Binary files a/logo.png and b/logo.png differ
+diff --git a/old_name.py b/new_name.py
+similarity index 100%
+rename from old_name.py
+rename to new_name.py
+diff --git a/mode.sh b/mode.sh
+old mode 100644
+new mode 100755
+diff --git a/cleanup.py b/cleanup.py
+index 1234567..7654321 100644
+--- a/cleanup.py
++++ b/cleanup.py
+@@ -1,3 +1,3 @@
+ keep = 1
+-drop = 2
++
+"""
+        scm_client = FakeSCMClient(diff_text)
+        with mock.patch("litellm.acompletion", mock.AsyncMock()) as acompletion:
+            self.assertTrue(await review_pr(self.config, scm_client, self.reviewer))
+        acompletion.assert_not_awaited()
+        self.assertEqual(scm_client.posted, [])
+
+    async def test_diff_is_parsed_while_details_are_fetched(self):
+        scm_client = FakeSCMClient(BATCHED_DIFF)
+        parse_started = threading.Event()
+        details_overlapped = []
+
+        def stream_pr_diff():
+            parse_started.set()
+            yield from BATCHED_DIFF.encode().splitlines()
+
+        def get_pr_details():
+            # Only returns early if the diff is being read before the details are awaited
+            details_overlapped.append(parse_started.wait(timeout=2))
+            return True
+
+        scm_client.stream_pr_diff = stream_pr_diff
+        scm_client.get_pr_details = get_pr_details
+        self.reviewer.get_review_for_chunk = mock.AsyncMock(return_value=[])
+        self.assertTrue(await review_pr(self.config, scm_client, self.reviewer))
+        self.assertEqual(details_overlapped, [True])
+        self.assertEqual(len(self.config.diff_files), 1)
+
+    async def test_dropped_diff_download_skips_the_review(self):
+        scm_client = FakeSCMClient(BATCHED_DIFF)
+        scm_client.stream_pr_diff = scm_client.stream_pr_diff_dropped
+        with mock.patch("litellm.acompletion", mock.AsyncMock()) as acompletion:
+            with self.assertLogs("drone_ai_pr_reviewer", "WARNING") as logs:
+                self.assertTrue(await review_pr(self.config, scm_client, self.reviewer))
+        self.assertIn("could not be fully retrieved", logs.output[-1])
+        acompletion.assert_not_awaited()
+        self.assertEqual(scm_client.posted, [])
+
+    async def test_batched_comments_land_on_hunk_lines(self):
+        # Comment on the last line of the first hunk and the first line of the next, in each request
+        async def fake_review(file_path, diff_chunk_content):
+            request = "second" if diff_chunk_content.startswith("@@ -40") else "first"
+            return [{"lineNumber": n, "reviewComment": f"{request} {n}"} for n in ((3, 4) if request == "first" else (2,))]
+
+        self.reviewer.get_review_for_chunk = fake_review
+        scm_client = FakeSCMClient(BATCHED_DIFF)
+        chunks = parse_diff_text(BATCHED_DIFF)[0].chunks
+        batch_max_chars = len(chunks[0].content_for_llm) + len(chunks[2].format_for_llm(chunks[0].llm_line_count))
+        with mock.patch("src.drone_ai_pr_reviewer.main.LLM_BATCH_MAX_CHARS", batch_max_chars):
+            self.assertTrue(await review_pr(self.config, scm_client, self.reviewer))
+        # Same-numbered lines of different hunks land on distinct positions of the file's diff
+        self.assertEqual(
+            sorted((comment.body, comment.file_path, comment.line_number, comment.position) for comment in scm_client.posted),
+            [("first 3", "app.py", 3, 3), ("first 4", "app.py", 1, 8), ("second 2", "app.py", 2, 16)]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import io
+import unittest
+from contextlib import redirect_stdout
+from src.drone_ai_pr_reviewer.plugin_config import PluginConfig
+from src.drone_ai_pr_reviewer.utils.constants import (
+    DEFAULT_LLM_CONCURRENCY, DEFAULT_LLM_QPS, DEFAULT_MAX_TOKENS, DEFAULT_TEMPERATURE
+)
+
+BASE_ENV = {"PLUGIN_LLM_MODEL": "gpt-4o", "PLUGIN_SCM_TOKEN": "test-token"}
+
+
+def load(**env) -> tuple:
+    """PluginConfig.from_env over BASE_ENV plus env, and whatever it printed."""
+    out = io.StringIO()
+    with redirect_stdout(out):
+        config = PluginConfig.from_env({**BASE_ENV, **env})
+    return config, out.getvalue()
+
+
+class TestPluginConfigFromEnv(unittest.TestCase):
+    def test_numbers(self):
+        # (variable, raw value, field, expected value, warns)
+        cases = [
+            ("PLUGIN_LLM_QPS", "2.5", "llm_qps", 2.5, False),
+            ("PLUGIN_LLM_QPS", "fast", "llm_qps", DEFAULT_LLM_QPS, True),
+            ("PLUGIN_LLM_QPS", "", "llm_qps", DEFAULT_LLM_QPS, True),
+            ("PLUGIN_LLM_CONCURRENCY", "4", "llm_concurrency", 4, False),
+            ("PLUGIN_LLM_CONCURRENCY", "4.5", "llm_concurrency", DEFAULT_LLM_CONCURRENCY, True),
+            ("PLUGIN_MAX_TOKENS", " 900 ", "max_tokens", 900, False),
+            ("PLUGIN_TEMPERATURE", "warm", "temperature", DEFAULT_TEMPERATURE, True),
+        ]
+        for name, raw, field, expected, warns in cases:
+            with self.subTest(name=name, raw=raw):
+                config, output = load(**{name: raw})
+                self.assertEqual(getattr(config, field), expected)
+                self.assertEqual(f"WARN: [PluginConfig] {name}" in output, warns)
+
+    def test_unset_numbers_use_defaults_silently(self):
+        config, output = load()
+        self.assertEqual((config.llm_qps, config.llm_concurrency, config.max_tokens),
+                         (DEFAULT_LLM_QPS, DEFAULT_LLM_CONCURRENCY, DEFAULT_MAX_TOKENS))
+        self.assertEqual(output, "")
+
+    def test_json_lists(self):
+        deployment = '{"model_name": "gpt-4o", "litellm_params": {"model": "azure/gpt-4o"}}'
+        # (raw value, expected deployments, warning fragment)
+        cases = [
+            (f"[{deployment}]", [{"model_name": "gpt-4o", "litellm_params": {"model": "azure/gpt-4o"}}], None),
+            ("", [], None),
+            ("[{'model_name': 'gpt-4o'}]", [], "is not valid JSON"),
+            ('{"model_name": "gpt-4o"}', [], "must be a JSON list"),
+        ]
+        for raw, expected, warning in cases:
+            with self.subTest(raw=raw):
+                config, output = load(PLUGIN_LLM_DEPLOYMENTS=raw)
+                self.assertEqual(config.llm_deployments, expected)
+                if warning:
+                    self.assertIn(f"WARN: [PluginConfig] PLUGIN_LLM_DEPLOYMENTS {warning}", output)
+                else:
+                    self.assertEqual(output, "")
+
+    def test_csv_lists(self):
+        # (variable, raw value, field, expected items)
+        cases = [
+            ("PLUGIN_LLM_FALLBACK_MODELS", " gpt-4o-mini , claude-3-haiku ", "llm_fallback_models", ["gpt-4o-mini", "claude-3-haiku"]),
+            ("PLUGIN_LLM_FALLBACK_MODELS", ",, ,", "llm_fallback_models", []),
+            ("PLUGIN_EXCLUDE_PATTERNS", "vendor/**,  *.lock,", "exclude_patterns", ["vendor/**", "*.lock"]),
+            ("PLUGIN_INCLUDE_PATTERNS", "src/*.py", "include_patterns", ["src/*.py"]),
+        ]
+        for name, raw, field, expected in cases:
+            with self.subTest(name=name, raw=raw):
+                self.assertEqual(getattr(load(**{name: raw})[0], field), expected)
+
+    def test_derived_fields(self):
+        config, _ = load(PLUGIN_LLM_MODEL="azure/gpt-4o", PLUGIN_EXCLUDE_PATTERNS="vendor/**",
+                         PLUGIN_LOG_LEVEL="verbose")
+        self.assertEqual(config.llm_provider, "azure")
+        self.assertEqual(config.log_level, "INFO")
+        self.assertFalse(config.path_filter("vendor/lib.py"))
+        self.assertTrue(config.path_filter("src/app.py"))
+
+
+if __name__ == '__main__':
+    unittest.main()
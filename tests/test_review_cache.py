@@ -0,0 +1,76 @@
+import os
+import tempfile
+import time
+import unittest
+from src.drone_ai_pr_reviewer.utils.review_cache import ReviewCheckpoint, ReviewDiskCache
+
+REVIEWS = [{"lineNumber": 3, "reviewComment": "Consider a guard clause."}]
+
+
+class TestReviewDiskCache(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.directory = os.path.join(temp_dir.name, "reviews")
+        self.cache = ReviewDiskCache(self.directory, ttl_seconds=60)
+
+    def test_round_trip(self):
+        self.assertIsNone(self.cache.get("key"))
+        self.cache.set("key", REVIEWS)
+        self.assertEqual(self.cache.get("key"), REVIEWS)
+        # Replacing an entry leaves no temporary files behind
+        self.cache.set("key", [])
+        self.assertEqual(self.cache.get("key"), [])
+        self.assertEqual(os.listdir(self.directory), ["key.json"])
+
+    def test_expired_entries_are_ignored(self):
+        self.cache.set("key", REVIEWS)
+        old = time.time() - 61
+        os.utime(os.path.join(self.directory, "key.json"), (old, old))
+        self.assertIsNone(self.cache.get("key"))
+
+    def test_corrupt_entries_are_misses(self):
+        for content in ("{not json", '[{"lineNumber": 3, "reviewCo', ""):
+            with self.subTest(content=content):
+                with open(os.path.join(self.directory, "key.json"), "w", encoding="utf-8") as f:
+                    f.write(content)
+                with self.assertLogs("src.drone_ai_pr_reviewer.utils.review_cache", "WARNING"):
+                    self.assertIsNone(self.cache.get("key"))
+
+
+class TestReviewCheckpoint(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.path = os.path.join(temp_dir.name, "run", "checkpoint.jsonl")
+
+    def open_checkpoint(self) -> ReviewCheckpoint:
+        checkpoint = ReviewCheckpoint(self.path)
+        self.addCleanup(checkpoint.close)
+        return checkpoint
+
+    def test_entries_survive_reopening(self):
+        checkpoint = self.open_checkpoint()
+        checkpoint.append("a", REVIEWS)
+        checkpoint.append("b", [])
+        checkpoint.close()
+
+        self.assertEqual(self.open_checkpoint().load(), {"a": REVIEWS, "b": []})
+
+    def test_truncated_last_line_is_skipped(self):
+        checkpoint = self.open_checkpoint()
+        checkpoint.append("a", REVIEWS)
+        checkpoint.close()
+        # A run killed in the middle of an append
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write('{"k": "b", "v": [{"lineNumber"')
+
+        resumed = self.open_checkpoint()
+        self.assertEqual(resumed.load(), {"a": REVIEWS})
+        # New entries start on a fresh line rather than extending the torn one
+        resumed.append("c", REVIEWS)
+        self.assertEqual(resumed.load(), {"a": REVIEWS, "c": REVIEWS})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import gzip
+import io
+import unittest
+from unittest import mock
+import requests
+from urllib3.response import HTTPResponse
+from src.drone_ai_pr_reviewer.diff_parser import parse_diff_text
+from src.drone_ai_pr_reviewer.models import ReviewComment
+from src.drone_ai_pr_reviewer.plugin_config import PluginConfig
+from src.drone_ai_pr_reviewer.scm_client import BaseSCMClient, DIFF_HEADERS
+
+# Multi-byte UTF-8 on both sides of the change, so small reads split characters
+DIFF = """\
+diff --git a/i18n.py b/i18n.py
+index 1234567..7654321 100644
+--- a/i18n.py
++++ b/i18n.py
+@@ -1,2 +1,3 @@
+ GREETING = "héllo → wörld"
++FAREWELL = "au revoir 👋"
+ DONE = "✓"
+""".encode("utf-8")
+
+
+class TrickleIO(io.BytesIO):
+    """A byte stream handing out at most 3 bytes per read, like a slow network body."""
+    def read(self, size=-1):
+        return super().read(3 if size is None or size < 0 else min(size, 3))
+
+    def read1(self, size=-1):
+        return self.read(size)
+
+
+def diff_response(body: bytes, headers: dict = None) -> requests.Response:
+    """A streamed 200 response whose body is read through urllib3 like a real one."""
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = HTTPResponse(body=TrickleIO(body), headers=headers or {}, status=200,
+                                preload_content=False, decode_content=False)
+    return response
+
+
+class TestStreamDiff(unittest.TestCase):
+    def setUp(self):
+        config = PluginConfig(llm_model="gpt-4o", scm_token="test-token",
+                              ci_repo_owner="octo", ci_repo_name="repo", ci_pr_number=7)
+        self.client = BaseSCMClient(config)
+        self.addCleanup(self.client.close)
+
+    def stream(self, response: requests.Response) -> list:
+        with mock.patch.object(self.client.session, "get", return_value=response) as get:
+            lines = list(self.client.stream_pr_diff())
+        get.assert_called_once_with("https://api.github.com/repos/octo/repo/pulls/7",
+                                    headers=DIFF_HEADERS, stream=True, timeout=30)
+        return lines
+
+    def assert_parses_to_original(self, lines: list):
+        self.assertEqual(lines, DIFF.split(b"\n")[:-1])
+        changes = parse_diff_text(iter(lines))[0].chunks[0].changes
+        self.assertEqual([change.content for change in changes],
+                         ['GREETING = "héllo → wörld"', 'FAREWELL = "au revoir 👋"', 'DONE = "✓"'])
+
+    def test_split_multibyte_characters(self):
+        self.assert_parses_to_original(self.stream(diff_response(DIFF)))
+
+    def test_gzip_encoded_body(self):
+        response = diff_response(gzip.compress(DIFF), {"Content-Encoding": "gzip"})
+        self.assert_parses_to_original(self.stream(response))
+        self.assertTrue(response.raw.closed)
+
+
+class TestPostReviewComments(unittest.TestCase):
+    def test_comments_are_posted_at_their_diff_position(self):
+        config = PluginConfig(llm_model="gpt-4o", scm_token="test-token", ci_repo_owner="octo",
+                              ci_repo_name="repo", ci_pr_number=7, ci_head_sha="abc123")
+        config.diff_files = parse_diff_text(DIFF)
+        client = BaseSCMClient(config)
+        self.addCleanup(client.close)
+        comments = [
+            ReviewComment(file_path="i18n.py", line_number=2, body="Translate this.", position=2),
+            ReviewComment(file_path="i18n.py", line_number=9, body="Not in the diff."),
+            ReviewComment(file_path="other.py", line_number=1, body="Not a diff file.", position=1),
+        ]
+        with mock.patch.object(client, "_request", return_value={"id": 1}) as request:
+            self.assertTrue(client.post_review_comments(comments))
+        payload = request.call_args.kwargs["json_data"]
+        self.assertEqual(payload["comments"], [{"path": "i18n.py", "body": "Translate this.", "position": 2}])
+
+
+if __name__ == '__main__':
+    unittest.main()